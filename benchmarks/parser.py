@@ -0,0 +1,66 @@
+"""
+Compare the speed of `parse_incoming_sms` with `IncomingSMSSchema`.
+
+Run from the root of the repository with::
+
+    PYTHONPATH=src python benchmarks/parser.py
+"""
+
+import argparse
+import timeit
+
+import django
+from django.conf import settings
+
+settings.configure(INSTALLED_APPS=["djnexmo"], USE_TZ=True)
+django.setup()
+
+from djnexmo.decorators import incoming_sms_parser, parse_incoming_sms  # noqa: E402
+
+PAYLOAD = {
+    "concat": "true",
+    "concat-part": "1",
+    "concat-ref": "78",
+    "concat-total": "9",
+    "keyword": "LOREM",
+    "message-timestamp": "2018-04-24 14:05:19",
+    "messageId": "0B000000D0EBB58D",
+    "msisdn": "447700900419",
+    "nonce": "0a455d75-459e-446c-9072-698728516d7c",
+    "sig": "c4bc6301949691b6093772ba246a35eb",
+    "text": "Lorem Ipsum is simply dummy text of the printing and typesetting in",
+    "timestamp": "1524578719",
+    "to": "447700900996",
+    "type": "unicode",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    assert parse_incoming_sms(PAYLOAD) == incoming_sms_parser.load(PAYLOAD)
+    results = {}
+    for name, parse in [
+        ("IncomingSMSSchema", incoming_sms_parser.load),
+        ("parse_incoming_sms", parse_incoming_sms),
+    ]:
+        elapsed = min(
+            timeit.repeat(lambda: parse(PAYLOAD), number=args.number, repeat=3)
+        )
+        results[name] = elapsed
+        print(
+            "{name:>20}: {us:7.2f} µs per payload".format(
+                name=name, us=elapsed / args.number * 1e6
+            )
+        )
+    print(
+        "{speedup:.1f}x faster".format(
+            speedup=results["IncomingSMSSchema"] / results["parse_incoming_sms"]
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
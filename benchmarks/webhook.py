@@ -0,0 +1,312 @@
+"""
+Measure the throughput of `sms_webhook` with realistic, signed traffic.
+
+Single and multi-part messages are generated and signed, and the parts of
+each multi-part message are delivered in a random order, by a pool of
+threads calling a decorated view with requests from Django's
+`RequestFactory`. Results are written as JSON, so they can be compared
+between commits.
+
+Run from the root of the repository with::
+
+    PYTHONPATH=src python benchmarks/webhook.py --concurrency 1 4 -o results.json
+
+By default a temporary SQLite database is used. To benchmark other
+databases, point `DJANGO_SETTINGS_MODULE` at settings which install
+`djnexmo` and define them, and pass their aliases with `--database`.
+Compare two results files with `--compare`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import django
+from django.conf import settings
+
+if "DJANGO_SETTINGS_MODULE" not in os.environ:
+    settings.configure(
+        INSTALLED_APPS=["djnexmo"],
+        DATABASES={
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3"),
+                "OPTIONS": {"timeout": 30},
+            }
+        },
+        DATABASE_ROUTERS=["__main__.BenchmarkRouter"],
+        NEXMO_SIGNATURE_SECRET="abcdefABCDEF12345",
+        USE_TZ=True,
+    )
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+import djnexmo  # noqa: E402
+from djnexmo.decorators import sms_webhook  # noqa: E402
+from djnexmo.idempotency import get_delivery_log  # noqa: E402
+from djnexmo.models import SMSMessagePart  # noqa: E402
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua"
+).split()
+
+
+class BenchmarkRouter:
+    """ Routes every query to the database being benchmarked. """
+
+    alias = "default"
+
+    def db_for_read(self, model, **hints):
+        return self.alias
+
+    def db_for_write(self, model, **hints):
+        return self.alias
+
+
+def generate_messages(count, multipart_ratio, max_parts, seed):
+    """
+    Return a list of `count` messages, each a list of signed webhook payloads.
+
+    The payloads for the parts of each multi-part message are shuffled.
+    """
+    rng = random.Random(seed)
+    messages = []
+    for index in range(count):
+        total = rng.randint(2, max_parts) if rng.random() < multipart_ratio else 1
+        msisdn = "4477009{n:05d}".format(n=rng.randrange(100000))
+        payloads = []
+        for part in range(1, total + 1):
+            payload = {
+                "keyword": "LOREM",
+                "message-timestamp": "2018-04-24 14:05:19",
+                "messageId": "{index:08X}{part:08X}".format(index=index, part=part),
+                "msisdn": msisdn,
+                "nonce": "{index}-{part}".format(index=index, part=part),
+                "text": " ".join(rng.choice(WORDS) for _ in range(25))[:153],
+                "timestamp": str(int(time.time())),
+                "to": "447700900996",
+                "type": "text",
+            }
+            if total > 1:
+                payload.update(
+                    {
+                        "concat": "true",
+                        "concat-part": str(part),
+                        "concat-ref": str(index),
+                        "concat-total": str(total),
+                    }
+                )
+            payload["sig"] = djnexmo.client.signature(payload)
+            payloads.append(payload)
+        rng.shuffle(payloads)
+        messages.append(payloads)
+    return messages
+
+
+def percentile(values, fraction):
+    """ Return the value `fraction` of the way through the sorted `values`. """
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run(alias, messages, concurrency):
+    """ Send `messages` to a decorated view from `concurrency` threads, and return the measurements. """
+    BenchmarkRouter.alias = alias
+    SMSMessagePart.objects.using(alias).all().delete()
+    get_delivery_log().clear()
+
+    delivered = []
+
+    @sms_webhook
+    def view(request):
+        delivered.append(len(request.sms.text))
+        return HttpResponse()
+
+    factory = RequestFactory()
+    requests = [
+        factory.post(
+            "/sms/incoming", data=json.dumps(payload), content_type="application/json"
+        )
+        for payloads in messages
+        for payload in payloads
+    ]
+    work = queue.Queue()
+    for request in requests:
+        work.put(request)
+    latencies = []
+    queries = []
+    errors = []
+
+    def count_queries(execute, sql, params, many, context):
+        queries.append(None)
+        return execute(sql, params, many, context)
+
+    def worker():
+        with connections[alias].execute_wrapper(count_queries):
+            while True:
+                try:
+                    request = work.get_nowait()
+                except queue.Empty:
+                    break
+                started = time.perf_counter()
+                response = view(request)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors or len(delivered) != len(messages):
+        raise RuntimeError(
+            "{delivered} of {count} messages delivered, {errors} errors".format(
+                delivered=len(delivered), count=len(messages), errors=len(errors)
+            )
+        )
+    latencies.sort()
+    return {
+        "database": alias,
+        "vendor": connections[alias].vendor,
+        "concurrency": concurrency,
+        "messages": len(messages),
+        "requests": len(requests),
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(requests) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+        },
+        "queries_per_message": round(len(queries) / len(messages), 2),
+        # The peak resident set size of the process so far, in KiB on Linux:
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path, current_path):
+    """ Print the change in throughput and latency for each run found in both results files. """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    runs = {(r["database"], r["concurrency"]): r for r in baseline["results"]}
+    for result in current["results"]:
+        before = runs.get((result["database"], result["concurrency"]))
+        if before is None:
+            continue
+        print(
+            "{database} x{concurrency}: {rps:+.1%} requests/s, {p99:+.1%} p99 latency".format(
+                database=result["database"],
+                concurrency=result["concurrency"],
+                rps=result["requests_per_second"] / before["requests_per_second"] - 1,
+                p99=result["latency_ms"]["p99"] / before["latency_ms"]["p99"] - 1,
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--messages", type=int, default=2000)
+    parser.add_argument(
+        "--multipart-ratio",
+        type=float,
+        default=0.3,
+        help="The fraction of messages sent in several parts.",
+    )
+    parser.add_argument("--max-parts", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument(
+        "--database",
+        nargs="+",
+        help="The aliases of the databases to benchmark. Defaults to all of them.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Write the results to this file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="Compare two results files, instead of running the benchmark.",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if settings.DATABASE_ROUTERS != ["__main__.BenchmarkRouter"]:
+        # Custom settings: route queries with our router ahead of theirs.
+        settings.DATABASE_ROUTERS = [BenchmarkRouter()] + list(
+            settings.DATABASE_ROUTERS
+        )
+
+    messages = generate_messages(
+        args.messages, args.multipart_ratio, args.max_parts, args.seed
+    )
+    results = []
+    for alias in args.database or list(settings.DATABASES):
+        call_command("migrate", "djnexmo", database=alias, verbosity=0)
+        for concurrency in args.concurrency:
+            result = run(alias, messages, concurrency)
+            results.append(result)
+            print(
+                "{database} x{concurrency}: {requests_per_second} requests/s, "
+                "p50 {p50} ms, p99 {p99} ms, {queries_per_message} queries/message".format(
+                    **result, **result["latency_ms"]
+                ),
+                file=sys.stderr,
+            )
+
+    output = json.dumps(
+        {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "options": {
+                "messages": args.messages,
+                "multipart_ratio": args.multipart_ratio,
+                "max_parts": args.max_parts,
+                "seed": args.seed,
+            },
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,11 @@ from setuptools import setup, find_packages
 
 REQUIREMENTS = [
     "nexmo          ~= 2.0",
-    "django         ~= 2.0",
+    "django         >= 2.2, < 4.0",
     "attrs          ~= 17.4",
     "marshmallow    >= 3.0.0rc3",
     "phonenumbers   ~= 8.9",
+    "PyJWT[crypto]  >= 1.6",
 ]
 
 DEV_REQUIREMENTS = [
@@ -37,11 +38,11 @@ setup(
     },
     install_requires=REQUIREMENTS,
     extras_require={"dev": DEV_REQUIREMENTS},
-    python_requires=">=3.4",
+    python_requires=">=3.5",
     classifiers=[
         "Development Status :: 4 - Beta",
-        "Framework :: Django :: 2.0",
-        "Framework :: Django :: 2.1",
+        "Framework :: Django :: 2.2",
+        "Framework :: Django :: 3.2",
         "Intended Audience :: Developers",
         "License :: OSI Approved :: Apache Software License",
         "Operating System :: OS Independent",
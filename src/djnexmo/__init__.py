@@ -1,16 +1,11 @@
-from django.conf import settings
-
-import nexmo
+from .clients import LazyClient
 
 __version__ = '0.0.4'
 
 default_app_config = "djnexmo.apps.NexmoConfig"
 
-client = nexmo.Client(
-    key=getattr(settings, "NEXMO_API_KEY", None),
-    secret=getattr(settings, "NEXMO_API_SECRET", None),
-    signature_secret=getattr(settings, "NEXMO_SIGNATURE_SECRET", None),
-    signature_method=getattr(settings, "NEXMO_SIGNATURE_METHOD", None),
-    application_id=getattr(settings, "NEXMO_APPLICATION_ID", None),
-    private_key=getattr(settings, "NEXMO_PRIVATE_KEY", None),
-)
+#: The Nexmo client configured from settings. It's constructed when it's first used.
+client = LazyClient()
+
+from .bulk import send_many  # noqa: E402 - these modules use `client`
+from .outbound import send  # noqa: E402
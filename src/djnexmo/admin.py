@@ -1,11 +1,158 @@
-from django.contrib import admin
+from functools import reduce
+import operator
 
-from .models import SMSMessagePart
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+from django.utils.timesince import timesince
+
+from .decorators import deliver_partial_message
+from .fields import PhoneNumberField
+from .formatting import normalize
+from .models import (
+    ArchivedMessage,
+    IncompleteMessage,
+    SMSDeliveryReceipt,
+    SMSMessagePart,
+)
+
+
+class CappedCountPaginator(Paginator):
+    """
+    A paginator which counts at most `max_count` objects.
+
+    Counting every row of a large table is slow, so only the first
+    `max_count` rows are counted, and only that many can be paged through.
+    """
+
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by()[: self.max_count].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    A `ModelAdmin` for tables of message parts, which may be very large.
+
+    Searches match phone numbers exactly if the search term starts with "=",
+    and otherwise match numbers starting with the search term, so they can be
+    answered from the index on `msisdn`. Search terms are normalised to the
+    format `msisdn` is stored in, with or without a leading "+".
+    """
+
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    search_fields = ("msisdn",)
+    view_on_site = False
+
+    def _normalize_number(self, search_term, exact):
+        field = self.model._meta.get_field("msisdn")
+        if not isinstance(field, PhoneNumberField):
+            return search_term.lstrip("+")
+        # A prefix can't be parsed, so only its "+" is normalised:
+        return field.normalize(search_term) if exact else normalize(search_term)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term.startswith("="):
+            number = self._normalize_number(search_term[1:].strip(), exact=True)
+            return queryset.filter(msisdn=number), False
+        search_term = self._normalize_number(search_term, exact=False)
+        if search_term.strip("+"):
+            # A range, rather than `startswith`, so the search can use the
+            # index regardless of the database's collation:
+            upper = search_term[:-1] + chr(ord(search_term[-1]) + 1)
+            return queryset.filter(msisdn__gte=search_term, msisdn__lt=upper), False
+        return queryset, False
 
 
 @admin.register(SMSMessagePart)
-class SMSMessagePartAdmin(admin.ModelAdmin):
+class SMSMessagePartAdmin(LargeTableAdmin):
     list_display = ("msisdn", "to", "__str__")
     list_display_links = ("__str__",)
-    search_fields = ("msisdn",)
-    view_on_site = False
+
+
+@admin.register(SMSDeliveryReceipt)
+class SMSDeliveryReceiptAdmin(LargeTableAdmin):
+    list_display = ("message_id", "msisdn", "to", "status", "message_timestamp")
+    list_filter = ("status",)
+
+
+@admin.register(ArchivedMessage)
+class ArchivedMessageAdmin(LargeTableAdmin):
+    list_display = ("message_id", "msisdn", "to", "text", "message_timestamp")
+    list_filter = ("region",)
+
+
+@admin.register(IncompleteMessage)
+class IncompleteMessageAdmin(LargeTableAdmin):
+    list_display = ("msisdn", "to", "concat_ref", "received", "age")
+    list_display_links = ("concat_ref",)
+    ordering = ("-pk",)
+    actions = ["purge", "force_deliver"]
+
+    def received(self, message):
+        return "{received} of {total}".format(
+            received=message.parts_received, total=message.concat_total
+        )
+
+    received.short_description = "Parts received"
+
+    def age(self, message):
+        return timesince(message.first_received)
+
+    age.admin_order_field = "first_received"
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Deleting the first part of a message would leave the others orphaned:
+        actions.pop("delete_selected", None)
+        return actions
+
+    def _parts(self, queryset):
+        groups = [
+            Q(msisdn=msisdn, to=to, concat_ref=concat_ref)
+            for msisdn, to, concat_ref in queryset.values_list(
+                "msisdn", "to", "concat_ref"
+            )
+        ]
+        return SMSMessagePart.objects.filter(reduce(operator.or_, groups)).order_by()
+
+    def purge(self, request, queryset):
+        parts = self._parts(queryset)
+        deleted = parts.delete()[0]
+        self.message_user(
+            request, "Deleted {count} message parts.".format(count=deleted)
+        )
+
+    purge.short_description = "Delete the parts of the selected messages"
+
+    def force_deliver(self, request, queryset):
+        handler_path = getattr(settings, "NEXMO_PARTIAL_MESSAGE_HANDLER", None)
+        if handler_path is None:
+            self.message_user(
+                request,
+                "Set NEXMO_PARTIAL_MESSAGE_HANDLER to deliver incomplete messages.",
+                messages.ERROR,
+            )
+            return
+        handler = import_string(handler_path)
+        delivered = 0
+        for message in queryset:
+            parts = message.parts()
+            deliver_partial_message(list(parts), handler)
+            parts.delete()
+            delivered += 1
+        self.message_user(
+            request, "Delivered {count} incomplete messages.".format(count=delivered)
+        )
+
+    force_deliver.short_description = "Deliver the selected messages as they are"
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class NexmoConfig(AppConfig):
     name = "djnexmo"
     verbose_name = "Nexmo"
+
+    def ready(self):
+        from .formatting import preload_regions
+        from . import metrics
+
+        preload_regions(getattr(settings, "NEXMO_PHONENUMBER_REGIONS", []))
+        metrics.configure()
@@ -0,0 +1,87 @@
+"""
+djnexmo.archive - an optional archive of the messages received by `sms_webhook`.
+
+If the `NEXMO_ARCHIVE` setting is `True`, each complete message received by
+`sms_webhook` is saved as an `ArchivedMessage`. Messages are saved in batches
+by a `BatchWriter`, configured with the `NEXMO_ARCHIVE_OPTIONS` setting, a
+dict of keyword arguments used to construct it. If the writer's queue is
+full, messages are dropped from the archive, unless the options include
+`"drop_when_full": False`, in which case they're saved by the webhook.
+"""
+
+import logging
+
+from django.conf import settings
+
+from .models import ArchivedMessage
+from .workers import Shared
+from .writers import BatchWriter
+
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveWriter(BatchWriter):
+    """ A `BatchWriter` which ignores messages which have already been archived. """
+
+    def __init__(self, drop_when_full=True, **kwargs):
+        super().__init__(**kwargs)
+        self.drop_when_full = drop_when_full
+        self._dropping = False
+
+    def _bulk_create(self, manager, instances):
+        # Nexmo may deliver the same message more than once:
+        manager.bulk_create(instances, ignore_conflicts=True)
+
+    def archive(self, sms, parts=1):
+        """ Queue `sms`, a complete `IncomingSMS` received in `parts` parts, to be archived. """
+        message = ArchivedMessage(
+            message_id=sms.message_id,
+            msisdn=sms.msisdn,
+            to=sms.to,
+            text=sms.text,
+            data=sms.data,
+            udh=sms.udh,
+            type=sms.type,
+            keyword=sms.keyword,
+            message_timestamp=sms.message_timestamp,
+            timestamp=sms.timestamp,
+            concat_ref=sms.concat_ref,
+            parts=parts,
+        )
+        # `bulk_create` doesn't send `pre_save`, which normalises the number:
+        ArchivedMessage._meta.get_field("msisdn").update_number_fields(message)
+        if self.write(message):
+            if self._dropping:
+                self._dropping = False
+                logger.warning("Resumed archiving messages.")
+        elif self.drop_when_full:
+            if not self._dropping:
+                self._dropping = True
+                logger.warning("The archive's queue is full; dropping messages.")
+        else:
+            # Saved the same way as a batch, so a repeat delivery is ignored:
+            self._bulk_create(ArchivedMessage.objects, [message])
+
+
+def _build_archive_writer():
+    if not getattr(settings, "NEXMO_ARCHIVE", False):
+        return None
+    return ArchiveWriter(**getattr(settings, "NEXMO_ARCHIVE_OPTIONS", {}))
+
+
+_archive_writer = Shared(
+    _build_archive_writer, ["NEXMO_ARCHIVE", "NEXMO_ARCHIVE_OPTIONS"]
+)
+
+
+def get_archive_writer():
+    """ Return the `ArchiveWriter` configured by the `NEXMO_ARCHIVE_OPTIONS` setting, or `None` if archiving is disabled. """
+    return _archive_writer.get()
+
+
+def archive(sms, parts=1):
+    """ Archive `sms`, a complete `IncomingSMS` received in `parts` parts, if archiving is enabled. """
+    writer = get_archive_writer()
+    if writer is not None:
+        writer.archive(sms, parts)
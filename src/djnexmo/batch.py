@@ -0,0 +1,234 @@
+"""
+djnexmo.batch - ingestion of many inbound SMS payloads in a single request.
+
+Replaying archived webhooks one HTTP request at a time costs a transaction
+and several queries for each message part. `sms_batch_webhook` makes a view
+which accepts a stream of newline-delimited JSON payloads, handles them in
+chunks with `PartStore.add_many`, and streams a newline-delimited JSON
+result back for each payload.
+"""
+
+import asyncio
+import copy
+from functools import wraps
+from itertools import islice
+import json
+import logging
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from marshmallow import ValidationError
+
+from . import client
+from .archive import archive
+from .decorators import (
+    _merge_parts,
+    _non_atomic,
+    _record_delivery,
+    get_json_loads,
+    parse_incoming_sms,
+)
+from .idempotency import get_delivery_log
+from .partstores import DuplicatePart, get_part_store
+from .signals import webhook_event
+
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPES = frozenset(["application/x-ndjson", "application/jsonl"])
+
+
+class BatchIngester:
+    """
+    Handles a stream of inbound SMS payloads, `chunk_size` at a time.
+
+    Payloads are checked with the same rules as `sms_webhook`. Complete
+    messages are passed to `func` with a copy of `request` whose `sms`
+    attribute is the message. Iterating over the ingester yields a result
+    dict for each payload.
+    """
+
+    def __init__(
+        self,
+        lines,
+        func,
+        request,
+        args=(),
+        kwargs=None,
+        validate_signature=True,
+        deduplicate=True,
+        chunk_size=200,
+    ):
+        self.lines = lines
+        self.func = func
+        self.request = request
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.validate_signature = validate_signature
+        self.deduplicate = deduplicate
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        payloads = (
+            (number, line) for number, line in enumerate(self.lines, 1) if line.strip()
+        )
+        while True:
+            chunk = list(islice(payloads, self.chunk_size))
+            if not chunk:
+                return
+            yield from self._ingest(chunk)
+
+    def _check(self, line):
+        """ Decode and check a payload, returning it and its message, or a result if it's rejected. """
+        try:
+            data = get_json_loads()(line)
+        except ValueError:
+            return None, None, "invalid_payload"
+        if not isinstance(data, dict):
+            return None, None, "invalid_payload"
+        message_id = data.get("messageId")
+        if (
+            self.deduplicate
+            and message_id is not None
+            and get_delivery_log().seen(message_id)
+        ):
+            webhook_event.send(sender=sms_batch_webhook, event="duplicate_delivery")
+            return data, None, "already_received"
+        if self.validate_signature and not client.check_signature(data):
+            webhook_event.send(sender=sms_batch_webhook, event="signature_rejected")
+            return data, None, "invalid_signature"
+        try:
+            return data, parse_incoming_sms(data), None
+        except (ValidationError, ValueError, TypeError, KeyError):
+            # One malformed payload shouldn't abandon the rest of the batch:
+            return data, None, "invalid_payload"
+
+    def _ingest(self, chunk):
+        results = []
+        complete = []
+        parts = []
+        accepted = set()
+        for number, line in chunk:
+            data, sms, outcome = self._check(line)
+            result = {"line": number}
+            if data is not None and "messageId" in data:
+                result["messageId"] = data["messageId"]
+            results.append(result)
+            if outcome is None and self.deduplicate:
+                # The delivery log only records messages once the chunk is handled:
+                if sms.message_id in accepted:
+                    webhook_event.send(
+                        sender=sms_batch_webhook, event="duplicate_delivery"
+                    )
+                    outcome = "already_received"
+                accepted.add(sms.message_id)
+            if outcome is not None:
+                result["result"] = outcome
+            elif sms.concat:
+                parts.append((result, data, sms))
+            else:
+                complete.append((result, data, sms, 1))
+
+        if parts:
+            stored = get_part_store().add_many([sms for _, _, sms in parts])
+            for (result, data, sms), outcome in zip(parts, stored):
+                if isinstance(outcome, DuplicatePart):
+                    webhook_event.send(sender=sms_batch_webhook, event="duplicate_part")
+                    result["result"] = "duplicate_part"
+                elif outcome is None:
+                    webhook_event.send(sender=sms_batch_webhook, event="part_stored")
+                    result["result"] = "stored"
+                    if self.deduplicate:
+                        _record_delivery(data, None)
+                else:
+                    webhook_event.send(
+                        sender=sms_batch_webhook,
+                        event="message_reassembled",
+                        parts=len(outcome),
+                    )
+                    complete.append(
+                        (result, data, _merge_parts(sms, outcome), len(outcome))
+                    )
+
+        for result, data, sms, count in complete:
+            self._handle(result, data, sms, count)
+        return (json.dumps(result) + "\n" for result in results)
+
+    def _handle(self, result, data, sms, parts):
+        request = copy.copy(self.request)
+        request.sms = sms
+        archive(sms, parts)
+        try:
+            response = self.func(request, *self.args, **self.kwargs)
+        except Exception as e:
+            # One failing message shouldn't abandon the rest of the batch:
+            logger.exception("Failed to handle message %s.", sms.message_id)
+            result.update(result="failed", error=repr(e))
+            return
+        status = getattr(response, "status_code", 200)
+        result.update(result="handled" if status < 400 else "failed", status=status)
+        if self.deduplicate:
+            _record_delivery(data, response)
+
+
+def sms_batch_webhook(
+    func=None, *, validate_signature=True, deduplicate=True, chunk_size=200
+):
+    """
+    Make a view which passes each message in a stream of webhook payloads to the decorated view.
+
+    Example::
+
+        @sms_webhook
+        def sms_registration(request):
+            ...
+
+        urlpatterns = [
+            path("sms/incoming", sms_registration),
+            path("sms/batch", sms_batch_webhook(sms_registration.__wrapped__)),
+        ]
+
+    The view accepts a `POST` request with a body of newline-delimited JSON
+    (`application/x-ndjson`), with one webhook payload on each line, as
+    Nexmo would send it with the `POST-JSON` method. Payloads are read from
+    the request as they're needed, and are checked with the same rules as
+    `sms_webhook`. Message parts are stored `chunk_size` at a time with the
+    part store's `add_many`, which `ModelPartStore` implements with a few
+    set-based queries. The decorated view is called for each complete
+    message, with `request.sms` set as it is by `sms_webhook`.
+
+    The response streams back a line of JSON for each payload, such as
+    `{"line": 1, "messageId": "...", "result": "handled", "status": 200}`.
+    `result` is one of "handled", "stored", "failed", "duplicate_part",
+    "already_received", "invalid_signature" and "invalid_payload".
+    """
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            raise TypeError("sms_batch_webhook doesn't support async views.")
+
+        @wraps(func)
+        @csrf_exempt
+        @require_POST
+        def inner(request, *args, **kwargs):
+            if request.content_type not in NDJSON_CONTENT_TYPES:
+                return HttpResponse("Unsupported request content-type.", status=415)
+            ingester = BatchIngester(
+                request,
+                func,
+                request,
+                args,
+                kwargs,
+                validate_signature=validate_signature,
+                deduplicate=deduplicate,
+                chunk_size=chunk_size,
+            )
+            return StreamingHttpResponse(ingester, content_type="application/x-ndjson")
+
+        return _non_atomic(inner)
+
+    if func is not None:
+        return decorator(func)
+    else:
+        return decorator
@@ -0,0 +1,156 @@
+"""
+djnexmo.bulk - send large numbers of SMS messages concurrently.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+import time
+
+import attr
+
+from . import client
+from .encoding import SegmentBudgetExceeded, get_encoder
+from .outbound import TokenBucket, _check_response, _is_retryable
+
+
+@attr.s
+class SendResult:
+    """ The outcome of sending a single message with `send_many`. """
+
+    params = attr.ib(type=dict)
+    response = attr.ib(type=dict, default=None)
+    exception = attr.ib(type=Exception, default=None)
+
+    @property
+    def ok(self):
+        return self.exception is None
+
+
+@attr.s
+class SendSummary:
+    """ Totals for the messages sent so far by `send_many`, and the results for any which failed. """
+
+    sent = attr.ib(type=int, default=0)
+    failed = attr.ib(type=list, default=attr.Factory(list))
+
+    @property
+    def total(self):
+        return self.sent + len(self.failed)
+
+
+class BulkSend:
+    """
+    Iterates over the results of sending messages concurrently.
+
+    Messages are read from the `messages` iterable as they're needed, so at
+    most a few more than `concurrency` messages are held in memory at once.
+    Each worker thread sends its messages over its own keep-alive HTTP
+    session. `summary` is updated as results are produced.
+    """
+
+    def __init__(self, messages, concurrency=10, rate=None, retries=2, backoff=0.5):
+        self.messages = iter(messages)
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate, burst=concurrency) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.summary = SendSummary()
+        self._local = threading.local()
+        self._sessions = []
+        self._closed_stats = {"requests": 0, "connections": 0, "reused": 0}
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            # A connection for each thread, with the client's timeout and retries:
+            session = self._local.session = client.build_session(pool_size=1)
+            self._sessions.append(session)
+        return session
+
+    def connection_stats(self):
+        """ Return the `PooledSession.connection_stats` of the worker threads' sessions, added together. """
+        stats = dict(self._closed_stats)
+        for session in list(self._sessions):
+            for name, value in session.connection_stats().items():
+                stats[name] += value
+        return stats
+
+    def _post(self, params):
+        with client.using_session(self._session()):
+            # `send_message` adds authentication to the dict it's given:
+            response = client.send_message(dict(params))
+        _check_response(response)
+        return response
+
+    def _send(self, params):
+        try:
+            prepared = get_encoder().prepare(params)
+        except SegmentBudgetExceeded as e:
+            return SendResult(params, exception=e)
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                return SendResult(params, response=self._post(prepared))
+            except Exception as e:
+                if attempt < self.retries and _is_retryable(e):
+                    time.sleep(self.backoff * 2 ** attempt)
+                    continue
+                return SendResult(params, exception=e)
+
+    def _submit(self, executor, pending):
+        for params in self.messages:
+            pending.add(executor.submit(self._send, params))
+            if len(pending) >= self.concurrency * 2:
+                return
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        pending = set()
+        try:
+            self._submit(executor, pending)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                self._submit(executor, pending)
+                for future in done:
+                    result = future.result()
+                    if result.ok:
+                        self.summary.sent += 1
+                    else:
+                        self.summary.failed.append(result)
+                    yield result
+        finally:
+            # If iteration stopped early, don't send the messages still queued:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            # Closing a session forgets its connections, so keep their stats:
+            self._closed_stats = self.connection_stats()
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+
+
+def send_many(messages, concurrency=10, rate=None, **kwargs):
+    """
+    Send SMS messages concurrently, yielding a `SendResult` for each as it completes.
+
+    `messages` can be any iterable of dicts of values for Nexmo's send SMS
+    API, including a generator. Up to `concurrency` messages are sent at
+    once, and at most `rate` messages are sent per second. Messages which are
+    throttled or hit a server error are retried. The `type` of messages
+    without one is chosen from their text, as it is by `djnexmo.send`, and
+    messages over the segment budget fail. Example::
+
+        results = djnexmo.send_many(
+            ({"to": to, "from": "447700900414", "text": "Hello!"} for to in numbers),
+            concurrency=8,
+            rate=30,
+        )
+        for result in results:
+            ...
+        print("Sent", results.summary.sent, "failed", len(results.summary.failed))
+
+    Returns a `BulkSend`, which sends messages as it's iterated over.
+    """
+    return BulkSend(messages, concurrency=concurrency, rate=rate, **kwargs)
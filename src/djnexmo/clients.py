@@ -0,0 +1,259 @@
+"""
+djnexmo.clients - construction of the Nexmo client used by djnexmo.
+"""
+
+from contextlib import contextmanager
+import os
+import threading
+import time
+from uuid import uuid4
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import force_bytes
+import jwt
+import nexmo
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+#: The settings used to construct the client, mapped to `nexmo.Client` arguments.
+CLIENT_SETTINGS = {
+    "NEXMO_API_KEY": "key",
+    "NEXMO_API_SECRET": "secret",
+    "NEXMO_SIGNATURE_SECRET": "signature_secret",
+    "NEXMO_SIGNATURE_METHOD": "signature_method",
+    "NEXMO_APPLICATION_ID": "application_id",
+    "NEXMO_PRIVATE_KEY": "private_key",
+    "NEXMO_JWT_LIFETIME": "jwt_lifetime",
+    "NEXMO_HTTP_POOL_SIZE": "pool_size",
+    "NEXMO_TIMEOUT": "timeout",
+    "NEXMO_RETRIES": "retries",
+}
+
+
+class PooledSession(requests.Session):
+    """
+    A `requests.Session` which keeps up to `pool_size` connections alive to each host.
+
+    Requests time out after `timeout` seconds (a number, or a tuple of the
+    connect and read timeouts) unless they say otherwise. Connections which
+    fail are retried up to `retries` times, as are reads of idempotent
+    requests, so a message is never sent twice.
+    """
+
+    def __init__(self, pool_size=10, timeout=10, retries=2):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, status=0, backoff_factor=0.1),
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+    def connection_stats(self):
+        """
+        Return a dict counting the requests made, and the connections opened to make them.
+
+        Requests which didn't open a connection reused one kept alive by an
+        earlier request.
+        """
+        stats = {"requests": 0, "connections": 0}
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    stats["requests"] += pool.num_requests
+                    stats["connections"] += pool.num_connections
+        stats["reused"] = stats["requests"] - stats["connections"]
+        return stats
+
+
+class Client(nexmo.Client):
+    """
+    A `nexmo.Client` which pools its connections and reuses the JWTs it signs.
+
+    Requests are made with a `PooledSession`, constructed with `pool_size`,
+    `timeout` and `retries`. Each process gets its own session, as
+    connections can't be shared with a forked process.
+
+    The private key is parsed once, when the first token is signed, and each
+    signed token is shared by every call made until shortly before it
+    expires, `jwt_lifetime` seconds (60 by default) after it was issued. Tokens with custom
+    claims, set with `auth`, aren't cached.
+    """
+
+    def __init__(
+        self,
+        *args,
+        jwt_lifetime=None,
+        pool_size=None,
+        timeout=None,
+        retries=None,
+        **kwargs
+    ):
+        self.pool_size = 10 if pool_size is None else pool_size
+        self.timeout = 10 if timeout is None else timeout
+        self.retries = 2 if retries is None else retries
+        self._session_lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._local = threading.local()
+        super().__init__(*args, **kwargs)
+        self.jwt_lifetime = jwt_lifetime or 60
+        self._jwt_lock = threading.Lock()
+        # Parsed when it's first needed, so a bad key doesn't stop the client
+        # being used to check signatures:
+        self._signing_key = None
+        self._jwt = None
+        self._jwt_refresh_at = 0
+        self._jwt_expires_at = 0
+        self.jwt_hits = 0
+        self.jwt_misses = 0
+
+    def build_session(self, pool_size=None):
+        """ Return a new `PooledSession` configured like this client's, with `pool_size` connections if it's given. """
+        return PooledSession(
+            pool_size=self.pool_size if pool_size is None else pool_size,
+            timeout=self.timeout,
+            retries=self.retries,
+        )
+
+    @property
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            return session
+        if self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session_pid != os.getpid():
+                    self._session = self.build_session()
+                    self._session_pid = os.getpid()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        # `nexmo.Client.__init__` sets a plain session, which is replaced when it's first used:
+        with self._session_lock:
+            self._session = self._session_pid = None
+
+    @contextmanager
+    def using_session(self, session):
+        """ Make the current thread's requests with `session`, instead of the process's, inside the block. """
+        previous = getattr(self._local, "session", None)
+        self._local.session = session
+        try:
+            yield session
+        finally:
+            self._local.session = previous
+
+    def connection_stats(self):
+        """ Return the `PooledSession.connection_stats` of this process's session. """
+        return self.session.connection_stats()
+
+    def generate_application_jwt(self, when=None):
+        if when is not None or self.auth_params:
+            return force_bytes(super().generate_application_jwt(when))
+        with self._jwt_lock:
+            now = time.time()
+            if now < self._jwt_refresh_at:
+                self.jwt_hits += 1
+                return self._jwt
+            self.jwt_misses += 1
+            if self._signing_key is None:
+                self._signing_key = load_pem_private_key(
+                    force_bytes(self.private_key),
+                    password=None,
+                    backend=default_backend(),
+                )
+            iat = int(now)
+            self._jwt = force_bytes(
+                jwt.encode(
+                    {
+                        "application_id": self.application_id,
+                        "iat": iat,
+                        "exp": iat + self.jwt_lifetime,
+                        "jti": str(uuid4()),
+                    },
+                    self._signing_key,
+                    algorithm="RS256",
+                )
+            )
+            self._jwt_expires_at = iat + self.jwt_lifetime
+            # Replace the token before it expires, allowing for a request in flight:
+            self._jwt_refresh_at = self._jwt_expires_at - self.jwt_lifetime / 10
+            return self._jwt
+
+    def jwt_cache_info(self):
+        """ Return a dict of the hits and misses of the JWT cache, and when the cached token expires. """
+        with self._jwt_lock:
+            return {
+                "hits": self.jwt_hits,
+                "misses": self.jwt_misses,
+                "expires": self._jwt_expires_at if self._jwt is not None else None,
+            }
+
+
+def build_client():
+    """ Construct a `Client` from the current settings. """
+    return Client(
+        **{
+            argument: getattr(settings, setting, None)
+            for setting, argument in CLIENT_SETTINGS.items()
+        }
+    )
+
+
+class LazyClient:
+    """
+    A proxy for a `Client`, which is constructed when it's first used.
+
+    The client is safe to share between threads, and is rebuilt when one of
+    its settings is changed (for example, with `override_settings`). Setting
+    an attribute on the proxy doesn't change the underlying client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+
+    def _get_client(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = build_client()
+                client = self._client
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self._get_client(), name)
+
+    def reset(self):
+        """ Discard the client, so it will be rebuilt from settings when it's next used. """
+        with self._lock:
+            self._client = None
+
+    def __repr__(self):
+        if self._client is None:
+            return "<LazyClient: not yet constructed>"
+        return "<LazyClient: {client!r}>".format(client=self._client)
+
+
+@receiver(setting_changed)
+def _reset_client(setting, **kwargs):
+    if setting in CLIENT_SETTINGS:
+        from . import client
+
+        client.reset()
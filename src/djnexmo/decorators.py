@@ -4,58 +4,91 @@ djnexmo.decorators - decorators that make it easier to work with Nexmo.
 
 """
 
+import asyncio
 from datetime import datetime, timezone
+from decimal import Decimal
 from functools import wraps
+from importlib import import_module
 import json
-
-from django.db import IntegrityError, transaction
-from django.http import HttpResponse
+import sys
+from operator import attrgetter
+
+import django
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.utils.module_loading import import_string
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_http_methods
 
 import attr
-from marshmallow import Schema, fields, post_load, EXCLUDE
+from marshmallow import Schema, ValidationError, fields, post_load, EXCLUDE
 import pytz
 
-from .models import SMSMessagePart
+try:
+    from asgiref.sync import async_to_sync, sync_to_async
+except ImportError:  # Django < 3.0
+    async_to_sync = sync_to_async = None
+
+from .models import SMSDeliveryReceipt, SMSMessagePart
+from .archive import archive
+from .dispatch import get_dispatcher
+from .idempotency import get_delivery_log
+from .metrics import StageTimer
+from .outbound import send
+from .partstores import DuplicatePart, get_part_store
+from .signals import webhook_event
+from .writers import get_receipt_writer
 
 from . import client
 
 
 TZ_LONDON = pytz.timezone('Europe/London')
 
-@attr.s
+SMS_TYPES = frozenset(["text", "unicode", "binary"])
+
+@attr.s(slots=True)
 class IncomingSMS:
     """ Object representing an incoming SMS message or part-message, parsed from JSON. """
     message_id = attr.ib(type=str)
     msisdn = attr.ib(type=str)
     to = attr.ib(type=str)
-    type = attr.ib(
-        type=str, validator=attr.validators.in_(["text", "unicode", "binary"])
-    )
+    type = attr.ib(type=str, validator=attr.validators.in_(SMS_TYPES))
     message_timestamp = attr.ib(type=datetime)
     timestamp = attr.ib(type=datetime)
 
     keyword = attr.ib(type=str, default=None)
     text = attr.ib(type=str, default=None)
-    # TODO: Need to do something with these:
-    data = attr.ib(default=None)
-    udh = attr.ib(default=None)
+    # The payload and User Data Header of binary messages. `data` is a
+    # `memoryview` for a reassembled multi-part message, otherwise `bytes`:
+    data = attr.ib(type=bytes, default=None)
+    udh = attr.ib(type=bytes, default=None)
 
     concat = attr.ib(type=bool, default=False)
     concat_part = attr.ib(type=int, default=None)
     concat_ref = attr.ib(type=str, default=None)
     concat_total = attr.ib(type=int, default=None)
 
-    def reply(self, text, type="text"):
-        client.send_message(
-            {"to": self.msisdn, "from": self.to, "text": text, "type": type}
-        )
+    def reply(self, text, type=None, callback=None):
+        """
+        Queue a reply to this message, returning a `Future` for Nexmo's response.
+
+        Unless `type` is given, it's chosen from the text (see `djnexmo.encoding`).
+        """
+        params = {"to": self.msisdn, "from": self.to, "text": text}
+        if type is not None:
+            params["type"] = type
+        return send(params, callback=callback)
 
     def to_model(self):
-        data = {a.name: getattr(self, a.name) for a in attr.fields(self.__class__)}
-        del data["concat"]
-        return SMSMessagePart(**data)
+        return SMSMessagePart(**dict(zip(_MODEL_FIELDS, _get_model_values(self))))
+
+
+# The attributes of IncomingSMS stored by SMSMessagePart:
+_MODEL_FIELDS = tuple(a.name for a in attr.fields(IncomingSMS) if a.name != "concat")
+_get_model_values = attrgetter(*_MODEL_FIELDS)
 
 
 class Timestamp(fields.Field):
@@ -66,6 +99,16 @@ class Timestamp(fields.Field):
         return datetime.utcfromtimestamp(int(value)).replace(tzinfo=timezone.utc)
 
 
+class HexBytes(fields.Field):
+    """ Marshmallow Field to decode a hex string into bytes. """
+
+    def _deserialize(self, value, attr, data):
+        try:
+            return bytes.fromhex(value)
+        except (TypeError, ValueError):
+            raise ValidationError("Not a valid hex string.")
+
+
 class IncomingSMSSchema(Schema):
     """ Marshmallow schema to map from Nexmo incoming SMS JSON to an IncomingSMS instance. """
     msisdn = fields.Str()
@@ -84,9 +127,8 @@ class IncomingSMSSchema(Schema):
     concat_ref = fields.Str(data_key="concat-ref")
     concat_total = fields.Int(data_key="concat-total")
 
-    # TODO: Need to do something with these:
-    data = fields.Str()
-    udh = fields.Str()
+    data = HexBytes()
+    udh = HexBytes()
 
     class Meta:
         unknown = EXCLUDE
@@ -96,13 +138,212 @@ class IncomingSMSSchema(Schema):
         d = data["message_timestamp"]
         if d.tzinfo is None:
             data["message_timestamp"] = d.replace(tzinfo=timezone.utc)
+        if "concat" not in data and data.get("udh"):
+            try:
+                _apply_udh_concat(data)
+            except ValueError:
+                raise ValidationError("Not a valid User Data Header.", "udh")
         return IncomingSMS(**data)
 
 
 incoming_sms_parser = IncomingSMSSchema()
 
 
-def sms_webhook(func=None, *, validate_signature=True):
+# Payload keys mapped to the IncomingSMS attributes they're parsed into:
+_STR_FIELDS = (
+    ("msisdn", "msisdn"),
+    ("to", "to"),
+    ("messageId", "message_id"),
+    ("text", "text"),
+    ("type", "type"),
+    ("keyword", "keyword"),
+    ("concat-ref", "concat_ref"),
+)
+_HEX_FIELDS = (("data", "data"), ("udh", "udh"))
+_INT_FIELDS = (("concat-part", "concat_part"), ("concat-total", "concat_total"))
+_BOOLS = {"true": True, "false": False}
+
+
+def _parse_message_timestamp(value):
+    """ Parse a `YYYY-MM-DD HH:MM:SS` UTC timestamp without the overhead of `strptime`. """
+    if len(value) != 19 or value[4:17:3] != "-- ::":
+        raise ValueError(value)
+    if _fromisoformat is not None:
+        return _fromisoformat(value).replace(tzinfo=timezone.utc)
+    fields = (
+        value[0:4],
+        value[5:7],
+        value[8:10],
+        value[11:13],
+        value[14:16],
+        value[17:19],
+    )
+    if not "".join(fields).isdigit():
+        raise ValueError(value)
+    return datetime(*map(int, fields), tzinfo=timezone.utc)
+
+
+# Python 3.7+ can parse the timestamp format natively:
+_fromisoformat = getattr(datetime, "fromisoformat", None)
+
+
+def _parse_sms(data):
+    kwargs = {}
+    for key, name in _STR_FIELDS:
+        if key in data:
+            value = data[key]
+            if value.__class__ is not str:
+                raise TypeError(key)
+            kwargs[name] = value
+    for key, name in _HEX_FIELDS:
+        if key in data:
+            kwargs[name] = bytes.fromhex(data[key])
+    for key, name in _INT_FIELDS:
+        if key in data:
+            kwargs[name] = int(data[key])
+    if "concat" in data:
+        kwargs["concat"] = _BOOLS[data["concat"]]
+    elif kwargs.get("udh"):
+        _apply_udh_concat(kwargs)
+    if "message-timestamp" in data:
+        kwargs["message_timestamp"] = _parse_message_timestamp(
+            data["message-timestamp"]
+        )
+    if "timestamp" in data:
+        kwargs["timestamp"] = datetime.fromtimestamp(
+            int(data["timestamp"]), timezone.utc
+        )
+    return IncomingSMS(**kwargs)
+
+
+# Information Element Identifiers for concatenated messages, with 8 and 16 bit references:
+IEI_CONCAT_8BIT = 0x00
+IEI_CONCAT_16BIT = 0x08
+
+
+def parse_udh(udh):
+    """
+    Parse a User Data Header into a list of (identifier, data) tuples, one for each of its information elements.
+
+    Raises `ValueError` if the header is malformed.
+    """
+    view = memoryview(udh)
+    try:
+        end = view[0] + 1
+        if end > len(view):
+            raise ValueError("Truncated User Data Header")
+        elements = []
+        index = 1
+        while index < end:
+            identifier, length = view[index], view[index + 1]
+            elements.append(
+                (identifier, view[index + 2 : index + 2 + length].tobytes())
+            )
+            index += 2 + length
+    except IndexError:
+        raise ValueError("Truncated User Data Header")
+    if index != end:
+        raise ValueError("Truncated User Data Header")
+    return elements
+
+
+def _apply_udh_concat(kwargs):
+    """ Set the `concat_*` values in `kwargs` from the concatenation element of its `udh`, if it has one. """
+    for identifier, value in parse_udh(kwargs["udh"]):
+        if identifier == IEI_CONCAT_8BIT and len(value) == 3:
+            ref, total, part = value
+        elif identifier == IEI_CONCAT_16BIT and len(value) == 4:
+            ref, total, part = value[0] << 8 | value[1], value[2], value[3]
+        else:
+            continue
+        if total > 1:
+            kwargs.update(
+                concat=True, concat_ref=str(ref), concat_part=part, concat_total=total
+            )
+        return
+
+
+def parse_incoming_sms(data):
+    """
+    Parse a Nexmo incoming SMS payload into an `IncomingSMS` instance.
+
+    This produces the same result as `IncomingSMSSchema().load(data)`, but is
+    much faster for well-formed payloads. Anything the fast parser doesn't
+    understand is passed to `IncomingSMSSchema`, so invalid payloads raise the
+    same errors. Set `settings.NEXMO_STRICT_PARSING` to `True` to always use
+    `IncomingSMSSchema`.
+    """
+    global _strict_parsing
+    if _strict_parsing is None:
+        _strict_parsing = getattr(settings, "NEXMO_STRICT_PARSING", False)
+    if not _strict_parsing:
+        try:
+            return _parse_sms(data)
+        except (KeyError, TypeError, ValueError):
+            pass
+    return incoming_sms_parser.load(data)
+
+
+_strict_parsing = None
+
+
+@receiver(setting_changed)
+def _reset_strict_parsing(setting, **kwargs):
+    global _strict_parsing
+    if setting == "NEXMO_STRICT_PARSING":
+        _strict_parsing = None
+
+
+#: The methods Nexmo can be configured to deliver webhooks with.
+WEBHOOK_METHODS = ["GET", "POST"]
+
+FORM_CONTENT_TYPES = frozenset(
+    ["application/x-www-form-urlencoded", "multipart/form-data"]
+)
+
+# Fast JSON libraries, tried in order if `NEXMO_JSON_LOADS` isn't set:
+_JSON_LIBRARIES = ("orjson", "ujson")
+
+
+def _default_json_loads():
+    for name in _JSON_LIBRARIES:
+        try:
+            return import_module(name).loads
+        except ImportError:
+            pass
+    if sys.version_info < (3, 6):
+        # `json.loads` only accepts bytes from Python 3.6:
+        return lambda body: json.loads(body.decode("utf-8"))
+    return json.loads
+
+
+def get_json_loads():
+    """
+    Return the function used to decode JSON webhook payloads from bytes.
+
+    This is the function named by `settings.NEXMO_JSON_LOADS` if it's set,
+    otherwise `loads` from `orjson` or `ujson` if either is installed,
+    otherwise `json.loads`. It must raise a `ValueError` if the payload is
+    invalid.
+    """
+    global _json_loads
+    if _json_loads is None:
+        path = getattr(settings, "NEXMO_JSON_LOADS", None)
+        _json_loads = import_string(path) if path else _default_json_loads()
+    return _json_loads
+
+
+_json_loads = None
+
+
+@receiver(setting_changed)
+def _reset_json_loads(setting, **kwargs):
+    global _json_loads
+    if setting == "NEXMO_JSON_LOADS":
+        _json_loads = None
+
+
+def sms_webhook(func=None, *, validate_signature=True, defer=False, deduplicate=True):
     """
     A decorator for views which respond to incoming SMS messages.
 
@@ -116,38 +357,73 @@ def sms_webhook(func=None, *, validate_signature=True):
 
     Behind the scenes, a couple of things are done for you:
 
+    * The message is read from the query string, a form or a JSON body, so
+      Nexmo can deliver webhooks with any of its `GET`, `POST` and
+      `POST-JSON` methods. JSON is decoded by the function returned by
+      `get_json_loads`.
     * The signature is verified against your signature secret, defined in
       `settings.NEXMO_SIGNATURE_SECRET`. If you don't want the signature to be
       verified, call with `sms_webhook` with `validate_signature=False`
-    * Messages sent as multiple parts are stored in the database until all
-      parts are available. The underlying view is only called once all parts
+    * Messages sent as multiple parts are stored until all parts are
+      available, by the part store configured with `settings.NEXMO_PART_STORE`
+      (the database, by default). The underlying view is only called once all parts
       are available and have been merged into a single `IncomingSMS` instance.
+    * Nexmo retries webhooks which it thinks have failed. The `messageId` of
+      each successfully handled message or part is recorded in the delivery
+      log configured with `settings.NEXMO_IDEMPOTENCY_OPTIONS`, and repeat
+      deliveries are acknowledged without calling the view again. Call with
+      `deduplicate=False` to disable this.
+
+    If `defer` is True then the webhook is acknowledged with a 200 response as
+    soon as the message is complete, and the view is called afterwards by the
+    dispatcher configured with `settings.NEXMO_DISPATCHER` (a pool of worker
+    threads, by default). The view's response is discarded. If the dispatcher
+    is at capacity then the view is called before the webhook is acknowledged.
+
+    Async views are supported on Django 3.1 or later. Everything before the
+    view is called is run in a thread with `sync_to_async`.
     """
 
     def decorator(func):
+        if asyncio.iscoroutinefunction(func) and django.VERSION < (3, 1):
+            raise TypeError("Async views need Django 3.1 or later.")
+        view = _deferred(func) if defer else func
+
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_inner(request, *args, **kwargs):
+                if request.method not in WEBHOOK_METHODS:
+                    return HttpResponseNotAllowed(WEBHOOK_METHODS)
+                timer = StageTimer(sms_webhook)
+                data, response = await sync_to_async(_receive)(
+                    request, validate_signature, deduplicate, timer
+                )
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    timer.lap("view")
+                if deduplicate and data is not None:
+                    await sync_to_async(_record_delivery)(data, response)
+                return response
+
+            # csrf_exempt and require_http_methods would wrap the view in a sync function:
+            async_inner.csrf_exempt = True
+            return _non_atomic(async_inner)
 
         @wraps(func)
         @csrf_exempt
-        @require_POST
+        @require_http_methods(WEBHOOK_METHODS)
         def inner(request, *args, **kwargs):
-            if request.content_type != "application/json":
-                return HttpResponse("Unsupported request content-type.", status=415)
-            try:
-                data = json.loads(request.body.decode("utf-8"))
-            except json.JSONDecodeError:
-                return HttpResponse("Invalid JSON payload provided.", status=400)
-            if not validate_signature or client.check_signature(data):
-                if data.get("concat") == "true":
-                    return _handle_message_part(request, data, func, args, kwargs)
-                else:
-                    request.sms = incoming_sms_parser.load(data)
-                    return func(request, *args, **kwargs)
-            else:
-                return HttpResponse(
-                    "Invalid signature.", status=403, reason="Invalid signature."
-                )
+            timer = StageTimer(sms_webhook)
+            data, response = _receive(request, validate_signature, deduplicate, timer)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                timer.lap("view")
+            if deduplicate and data is not None:
+                _record_delivery(data, response)
+            return response
 
-        return inner
+        return _non_atomic(inner)
 
     if func is not None:
         return decorator(func)
@@ -155,36 +431,328 @@ def sms_webhook(func=None, *, validate_signature=True):
         return decorator
 
 
-def _handle_message_part(request, data, wrapped_func, args, kwargs):
-    # Put it in the database.
+def _non_atomic(view):
+    """
+    Exempt `view` from `ATOMIC_REQUESTS` on every database.
+
+    `ModelPartStore` must commit each part as soon as it's stored, or the
+    final part of a message may not be detected.
+    """
+    for alias in connections:
+        view = transaction.non_atomic_requests(using=alias)(view)
+    return view
+
+
+def _deferred(func):
+    """ Wrap `func` so it's called by the configured dispatcher. """
+    if asyncio.iscoroutinefunction(func):
+        # The dispatcher's threads call views synchronously:
+        call = async_to_sync(func)
+
+        @wraps(func)
+        async def async_deferred(request, *args, **kwargs):
+            if await sync_to_async(get_dispatcher().submit)(
+                call, request, args, kwargs
+            ):
+                return HttpResponse("Message accepted.")
+            return await func(request, *args, **kwargs)
+
+        return async_deferred
+
+    @wraps(func)
+    def deferred(request, *args, **kwargs):
+        if get_dispatcher().submit(func, request, args, kwargs):
+            return HttpResponse("Message accepted.")
+        return func(request, *args, **kwargs)
+
+    return deferred
+
+
+def _decode_payload(request):
+    """
+    Return the parameters of a webhook request as a dict, whichever way Nexmo sent them.
+
+    Raises `ValueError` if a JSON body can't be decoded.
+    """
+    if request.method == "GET":
+        return request.GET.dict()
+    if request.content_type == "application/json":
+        return get_json_loads()(request.body)
+    if request.content_type in FORM_CONTENT_TYPES:
+        return request.POST.dict()
+    return None
+
+
+def _load_payload(request, sender, validate_signature, deduplicate, timer):
+    """
+    Decode and verify the payload of a webhook request, timing each step with `timer`.
+
+    `sender` is the decorator which made the view, and is the sender of the
+    `webhook_event` signals sent for rejected payloads.
+
+    Returns a tuple of the decoded payload and `None`, or `None` and a
+    response if the payload is invalid or has already been handled.
+    """
     try:
-        with transaction.atomic():
-            incoming_sms = incoming_sms_parser.load(data)
-            incoming_sms.to_model().save()
-    except IntegrityError:
-        return HttpResponse("Partial message already stored.")
-
-    # Then query if we have all the parts
-    matching_parts = SMSMessagePart.objects.filter(concat_ref=incoming_sms.concat_ref)
-    count = matching_parts.count()
-    expected = incoming_sms.concat_total
-    if count == expected:
-        # If we have all the parts then create a FrankenSMS from the pieces,
-        # and call the wrapped view function:
-        text = "".join(part.text for part in matching_parts)
-        request.sms = IncomingSMS(
-            msisdn=incoming_sms.msisdn,
-            to=incoming_sms.to,
-            message_id=incoming_sms.message_id,
-            text=text,
-            type=incoming_sms.type,
-            keyword=incoming_sms.keyword,
-            message_timestamp=incoming_sms.message_timestamp,
-            timestamp=incoming_sms.timestamp,
-            concat=False,
-            concat_ref=incoming_sms.concat_ref,
+        data = _decode_payload(request)
+    except ValueError:
+        return None, HttpResponse("Invalid JSON payload provided.", status=400)
+    if data is None:
+        return None, HttpResponse("Unsupported request content-type.", status=415)
+    timer.lap("decode")
+    # A repeat delivery can be acknowledged before checking its signature, as it's not acted upon:
+    if deduplicate:
+        message_id = data.get("messageId")
+        seen = message_id is not None and get_delivery_log().seen(message_id)
+        timer.lap("deduplicate")
+        if seen:
+            webhook_event.send(sender=sender, event="duplicate_delivery")
+            return None, HttpResponse("Message already received.")
+    if validate_signature:
+        valid = client.check_signature(data)
+        timer.lap("signature")
+        if not valid:
+            webhook_event.send(sender=sender, event="signature_rejected")
+            return (
+                None,
+                HttpResponse(
+                    "Invalid signature.", status=403, reason="Invalid signature."
+                ),
+            )
+    return data, None
+
+
+def _record_delivery(data, response):
+    """ Record a message as delivered if it was handled successfully. """
+    message_id = data.get("messageId")
+    # Views may return objects other than responses, which are treated as successful:
+    if message_id is not None and getattr(response, "status_code", 200) < 400:
+        get_delivery_log().record(message_id)
+
+
+def _merge_parts(incoming_sms, parts):
+    """ Create a FrankenSMS from the pieces of a multi-part message. """
+    if incoming_sms.type == "binary":
+        text = None
+        data = _merge_data(parts)
+        udh = _strip_concat(parts[0].udh)
+    else:
+        text = "".join(part.text for part in parts)
+        data = udh = None
+    return IncomingSMS(
+        msisdn=incoming_sms.msisdn,
+        to=incoming_sms.to,
+        message_id=incoming_sms.message_id,
+        text=text,
+        data=data,
+        udh=udh,
+        type=incoming_sms.type,
+        keyword=incoming_sms.keyword,
+        message_timestamp=incoming_sms.message_timestamp,
+        timestamp=incoming_sms.timestamp,
+        concat=False,
+        concat_ref=incoming_sms.concat_ref,
+    )
+
+
+def _merge_data(parts):
+    """ Join the binary payloads of `parts` in a single buffer, returning a `memoryview` of it. """
+    buffer = memoryview(bytearray(sum(len(part.data or b"") for part in parts)))
+    offset = 0
+    for part in parts:
+        if part.data:
+            end = offset + len(part.data)
+            buffer[offset:end] = part.data
+            offset = end
+    return buffer
+
+
+def _strip_concat(udh):
+    """ Remove the concatenation element from `udh`, returning `None` if nothing's left. """
+    if not udh:
+        return None
+    elements = [
+        (identifier, value)
+        for identifier, value in parse_udh(udh)
+        if identifier not in (IEI_CONCAT_8BIT, IEI_CONCAT_16BIT)
+    ]
+    if not elements:
+        return None
+    body = b"".join(
+        bytes([identifier, len(value)]) + value for identifier, value in elements
+    )
+    return bytes([len(body)]) + body
+
+
+def deliver_partial_message(parts, handler):
+    """
+    Pass the incomplete message made up of `parts`, ordered by part number, to `handler`.
+
+    The handler is called with an `IncomingSMS` containing the text of the
+    parts which were received, and a list of the missing part numbers.
+    """
+    received = {part.concat_part for part in parts}
+    missing = [n for n in range(1, parts[0].concat_total + 1) if n not in received]
+    return handler(_merge_parts(parts[0], parts), missing)
+
+
+def _receive(request, validate_signature, deduplicate, timer):
+    """
+    Load the incoming message from an `sms_webhook` request, and store it if it's a message part.
+
+    Returns a tuple of the decoded payload, or `None` if it was rejected, and
+    the response to return without calling the view. If the view should be
+    called, the response is `None` and the complete message is assigned to
+    `request.sms`.
+    """
+    data, response = _load_payload(
+        request, sms_webhook, validate_signature, deduplicate, timer
+    )
+    if response is not None:
+        return None, response
+    incoming_sms = parse_incoming_sms(data)
+    timer.lap("parse")
+    if not incoming_sms.concat:
+        request.sms = incoming_sms
+        archive(incoming_sms)
+        return data, None
+
+    try:
+        parts = get_part_store().add(incoming_sms)
+    except DuplicatePart:
+        webhook_event.send(sender=sms_webhook, event="duplicate_part")
+        return data, HttpResponse("Partial message already stored.")
+    finally:
+        timer.lap("store")
+
+    if parts is not None:
+        # If we have all the parts then merge them, ready for the wrapped view function:
+        webhook_event.send(
+            sender=sms_webhook, event="message_reassembled", parts=len(parts)
         )
-        matching_parts.delete()
-        return wrapped_func(request, *args, **kwargs)
+        request.sms = _merge_parts(incoming_sms, parts)
+        archive(request.sms, len(parts))
+        return data, None
     else:
-        return HttpResponse("Partial message received.")
+        webhook_event.send(sender=sms_webhook, event="part_stored")
+        return data, HttpResponse("Partial message received.")
+
+
+@attr.s(slots=True)
+class DeliveryReceipt:
+    """ Object representing a delivery receipt for a message sent with Nexmo, parsed from JSON. """
+
+    message_id = attr.ib(type=str)
+    msisdn = attr.ib(type=str)
+    to = attr.ib(type=str)
+    status = attr.ib(type=str)
+    err_code = attr.ib(type=str, default=None)
+    network_code = attr.ib(type=str, default=None)
+    price = attr.ib(type=Decimal, default=None)
+    scts = attr.ib(type=datetime, default=None)
+    message_timestamp = attr.ib(type=datetime, default=None)
+    client_ref = attr.ib(type=str, default=None)
+
+    def to_model(self):
+        return SMSDeliveryReceipt(**attr.asdict(self))
+
+
+# Payload keys mapped to the DeliveryReceipt attributes they're parsed into:
+_RECEIPT_STR_FIELDS = (
+    ("messageId", "message_id"),
+    ("msisdn", "msisdn"),
+    ("to", "to"),
+    ("status", "status"),
+    ("err-code", "err_code"),
+    ("network-code", "network_code"),
+    ("client-ref", "client_ref"),
+)
+
+
+def _parse_scts(value):
+    """ Parse the `YYMMDDHHMM` UTC time a receipt was generated by the carrier. """
+    if len(value) != 10 or not value.isdigit():
+        raise ValueError(value)
+    return datetime(
+        2000 + int(value[0:2]),
+        int(value[2:4]),
+        int(value[4:6]),
+        int(value[6:8]),
+        int(value[8:10]),
+        tzinfo=timezone.utc,
+    )
+
+
+def parse_delivery_receipt(data):
+    """
+    Parse a Nexmo delivery receipt payload into a `DeliveryReceipt` instance.
+
+    Raises `ValueError` if the payload is invalid.
+    """
+    kwargs = {}
+    try:
+        for key, name in _RECEIPT_STR_FIELDS:
+            value = data.get(key)
+            if value is not None:
+                if value.__class__ is not str:
+                    raise TypeError(key)
+                kwargs[name] = value
+        if data.get("price"):
+            kwargs["price"] = Decimal(data["price"])
+        if data.get("scts"):
+            kwargs["scts"] = _parse_scts(data["scts"])
+        if data.get("message-timestamp"):
+            kwargs["message_timestamp"] = _parse_message_timestamp(
+                data["message-timestamp"]
+            )
+        return DeliveryReceipt(**kwargs)
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise ValueError("Invalid delivery receipt: {}".format(e)) from e
+
+
+def dlr_webhook(func=None, *, validate_signature=True, store=False):
+    """
+    A decorator for views which respond to delivery receipts.
+
+    Example::
+
+        @dlr_webhook(store=True)
+        def delivery_receipt_view(request):
+            # Access the `DeliveryReceipt` object via `request.receipt`
+            if request.receipt.status == "failed":
+                Reminder.objects.filter(message_id=request.receipt.message_id).update(failed=True)
+
+    As with `sms_webhook`, receipts can be delivered with any of Nexmo's
+    webhook methods, and the signature is verified unless
+    `validate_signature=False`. If `store` is True then each receipt is
+    also saved as an `SMSDeliveryReceipt`, in batches by the writer
+    configured with `settings.NEXMO_DLR_WRITER_OPTIONS`. Invalid receipts
+    get a 400 response, and aren't passed to the view.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        @csrf_exempt
+        @require_http_methods(WEBHOOK_METHODS)
+        def inner(request, *args, **kwargs):
+            data, response = _load_payload(
+                request, dlr_webhook, validate_signature, False, StageTimer(dlr_webhook)
+            )
+            if response is not None:
+                return response
+            try:
+                request.receipt = parse_delivery_receipt(data)
+            except ValueError:
+                return HttpResponse("Invalid delivery receipt.", status=400)
+            if store:
+                record = request.receipt.to_model()
+                if not get_receipt_writer().write(record):
+                    record.save()
+            return func(request, *args, **kwargs)
+
+        return inner
+
+    if func is not None:
+        return decorator(func)
+    else:
+        return decorator
@@ -0,0 +1,132 @@
+"""
+djnexmo.dispatch - backends which call webhook views after the webhook has been acknowledged.
+
+Views decorated with `sms_webhook(defer=True)` are handed to the dispatcher
+configured with the `NEXMO_DISPATCHER` setting, a dotted path to a
+`Dispatcher` subclass, and the optional `NEXMO_DISPATCHER_OPTIONS` setting, a
+dict of keyword arguments used to construct it.
+"""
+
+import logging
+import queue
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .workers import Shared, WorkerPool
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISPATCHER = "djnexmo.dispatch.ThreadPoolDispatcher"
+
+
+class Dispatcher:
+    """
+    Base class for backends which call views after their webhook has been acknowledged.
+
+    Subclass this to hand messages to an external task queue. For example::
+
+        class CeleryDispatcher(Dispatcher):
+            def submit(self, func, request, args, kwargs):
+                handle_sms.delay(attr.asdict(request.sms))
+                return True
+    """
+
+    def submit(self, func, request, args, kwargs):
+        """
+        Arrange for `func(request, *args, **kwargs)` to be called.
+
+        Returns `True` if the call was accepted, or `False` if the dispatcher is
+        at capacity, in which case the view is called before the webhook is
+        acknowledged.
+        """
+        raise NotImplementedError()
+
+    def stats(self):
+        """ Return a dict of metrics describing the dispatcher. """
+        return {}
+
+
+class ThreadPoolDispatcher(WorkerPool, Dispatcher):
+    """
+    Calls views from a pool of worker threads in the current process.
+
+    Calls wait in a queue holding at most `queue_size` calls. When the queue is
+    full `submit` waits up to `timeout` seconds for space before rejecting the
+    call, so a backlog slows down the acknowledgement of new webhooks instead
+    of growing without bound. Calls still queued when the process exits are
+    completed before it exits.
+    """
+
+    thread_name = "djnexmo-dispatch"
+
+    def __init__(self, workers=4, queue_size=1000, timeout=0):
+        super().__init__(workers, queue_size)
+        self.timeout = timeout
+
+        self.handled = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def submit(self, func, request, args, kwargs):
+        try:
+            self._put((func, request, args, kwargs), timeout=self.timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        return True
+
+    def _handle(self, item):
+        func, request, args, kwargs = item
+        close_old_connections()
+        start = time.perf_counter()
+        failed = False
+        try:
+            func(request, *args, **kwargs)
+        except Exception:
+            failed = True
+            logger.exception("Deferred webhook view %r failed.", func)
+        finally:
+            elapsed = time.perf_counter() - start
+            close_old_connections()
+            with self._lock:
+                self.handled += 1
+                self.failed += failed
+                self.latency_total += elapsed
+                self.latency_max = max(self.latency_max, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "handled": self.handled,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "latency_total": self.latency_total,
+                "latency_max": self.latency_max,
+            }
+
+
+def _build_dispatcher():
+    dispatcher_class = import_string(
+        getattr(settings, "NEXMO_DISPATCHER", DEFAULT_DISPATCHER)
+    )
+    return dispatcher_class(**getattr(settings, "NEXMO_DISPATCHER_OPTIONS", {}))
+
+
+_dispatcher = Shared(
+    _build_dispatcher, ["NEXMO_DISPATCHER", "NEXMO_DISPATCHER_OPTIONS"]
+)
+
+
+def get_dispatcher():
+    """ Return the `Dispatcher` configured by the `NEXMO_DISPATCHER` settings. """
+    return _dispatcher.get()
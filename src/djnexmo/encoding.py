@@ -0,0 +1,258 @@
+"""
+djnexmo.encoding - choose the encoding of outbound SMS messages, and count their segments.
+
+An SMS holds 160 characters of the GSM 03.38 alphabet (GSM-7), or 70 UTF-16
+code units (UCS-2). A message which doesn't fit is split into segments of 153
+GSM-7 characters or 67 UCS-2 code units, each billed separately. A single
+character outside the GSM-7 alphabet, such as a curly quote, makes the
+whole message UCS-2, so it costs more than twice as many segments.
+
+`analyse` classifies text and counts its segments, and `transliterate`
+replaces common non-GSM characters with GSM-7 equivalents. `djnexmo.send`,
+`djnexmo.send_many` and `IncomingSMS.reply` use the `Encoder` configured by the
+`NEXMO_ENCODING_OPTIONS` setting to set the `type` of messages which don't
+have one, and to enforce a budget of segments per message.
+"""
+
+import logging
+import unicodedata
+
+import attr
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+GSM_7 = "GSM-7"
+UCS_2 = "UCS-2"
+
+#: The characters of the GSM 03.38 default alphabet, each sent as one septet.
+GSM_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+#: The characters of the GSM 03.38 extension table, each sent as two septets.
+GSM_EXTENSION = "\f^{}\\[~]|€"
+
+# Single-part and per-segment capacities, in septets or UTF-16 code units:
+_CAPACITY = {GSM_7: (160, 153), UCS_2: (70, 67)}
+
+# Deletes the basic characters, so only the extension characters and those
+# outside the GSM-7 alphabet are left:
+_GSM_TABLE = dict.fromkeys(map(ord, GSM_BASIC))
+_GSM_EXTENSION_SET = frozenset(GSM_EXTENSION)
+
+_TRANSLITERATIONS = str.maketrans(
+    {
+        "\u00a0": " ",  # no-break space
+        "\u2007": " ",  # figure space
+        "\u2009": " ",  # thin space
+        "\u202f": " ",  # narrow no-break space
+        "\u200b": "",  # zero-width space
+        "\ufeff": "",  # byte order mark
+        "‘": "'",  # curly quotes
+        "’": "'",
+        "‚": "'",
+        "‛": "'",
+        "′": "'",
+        "“": '"',
+        "”": '"',
+        "„": '"',
+        "″": '"',
+        "«": '"',
+        "»": '"',
+        "‐": "-",  # hyphens and dashes
+        "‑": "-",
+        "‒": "-",
+        "–": "-",
+        "—": "-",
+        "―": "-",
+        "−": "-",
+        "…": "...",
+        "•": "-",  # bullet
+        "·": ".",
+        "⁄": "/",
+        "×": "x",
+        "`": "'",
+        "´": "'",
+        "ç": "Ç",  # GSM 03.38 only has the capital
+        "ê": "e",
+        "ë": "e",
+        "á": "a",
+        "â": "a",
+        "ã": "a",
+        "í": "i",
+        "î": "i",
+        "ï": "i",
+        "ó": "o",
+        "ô": "o",
+        "õ": "o",
+        "ú": "u",
+        "û": "u",
+        "Á": "A",
+        "À": "A",
+        "Â": "A",
+        "È": "E",
+        "Ê": "E",
+        "Í": "I",
+        "Ó": "O",
+        "Ú": "U",
+    }
+)
+
+
+class SegmentBudgetExceeded(ValueError):
+    """ Raised when a message needs more segments than its budget allows. """
+
+    def __init__(self, message, analysis):
+        super().__init__(message)
+        self.analysis = analysis
+
+
+@attr.s(slots=True, frozen=True)
+class Analysis:
+    """ The encoding of a message's text, its length in that encoding, and the number of segments it's sent in. """
+
+    encoding = attr.ib(type=str)
+    length = attr.ib(type=int)
+    segments = attr.ib(type=int)
+
+    @property
+    def type(self):
+        """ The value of Nexmo's `type` parameter for this encoding. """
+        return "text" if self.encoding == GSM_7 else "unicode"
+
+
+def _count_segments(length, costs, encoding):
+    """
+    Return the number of segments needed for text `length` units long.
+
+    `costs` is an iterable of the cost in units of each character, needed
+    only if some characters cost two units, which can't be split across
+    segments.
+    """
+    single, multi = _CAPACITY[encoding]
+    if length <= single:
+        return 1 if length else 0
+    if costs is None:
+        return -(-length // multi)
+    segments, used = 1, 0
+    for cost in costs:
+        if used + cost > multi:
+            segments += 1
+            used = 0
+        used += cost
+    return segments
+
+
+def analyse(text):
+    """ Return an `Analysis` of `text`, classifying it as GSM-7 or UCS-2 and counting its segments. """
+    rest = text.translate(_GSM_TABLE)
+    if not rest:
+        return Analysis(GSM_7, len(text), _count_segments(len(text), None, GSM_7))
+    if _GSM_EXTENSION_SET.issuperset(rest):
+        costs = (2 if c in _GSM_EXTENSION_SET else 1 for c in text)
+        length = len(text) + len(rest)
+        return Analysis(GSM_7, length, _count_segments(length, costs, GSM_7))
+    # Characters outside the Basic Multilingual Plane take two UTF-16 code units:
+    length = len(text.encode("utf-16-le")) // 2
+    costs = None
+    if length != len(text):
+        costs = (2 if ord(c) > 0xFFFF else 1 for c in text)
+    return Analysis(UCS_2, length, _count_segments(length, costs, UCS_2))
+
+
+def is_gsm(text):
+    """ Return whether `text` can be sent with the GSM-7 encoding. """
+    return _GSM_EXTENSION_SET.issuperset(text.translate(_GSM_TABLE))
+
+
+def transliterate(text):
+    """
+    Replace characters in `text` which aren't in the GSM-7 alphabet with similar ones which are, where possible.
+
+    Curly quotes, dashes and unusual spaces are replaced from a table, and
+    other accented letters by their unaccented forms. Characters with no
+    GSM-7 equivalent, such as emoji, are kept.
+    """
+    text = text.translate(_TRANSLITERATIONS)
+    if is_gsm(text):
+        return text
+    return "".join(c if is_gsm(c) else _strip_accents(c) for c in text)
+
+
+def _strip_accents(c):
+    base = "".join(
+        d for d in unicodedata.normalize("NFKD", c) if not unicodedata.combining(d)
+    )
+    return base if base and is_gsm(base) else c
+
+
+class Encoder:
+    """
+    Sets the `type` of outbound messages from their text, and checks their length.
+
+    If `transliterate` is True, the text of messages without a `type` is
+    transliterated where that lets them be sent as GSM-7. If a message needs
+    more than `max_segments` segments, a warning is logged, or if
+    `over_budget` is "raise", `SegmentBudgetExceeded` is raised.
+    """
+
+    def __init__(self, transliterate=False, max_segments=None, over_budget="warn"):
+        if over_budget not in ("warn", "raise"):
+            raise ValueError('over_budget must be "warn" or "raise".')
+        self.transliterate = transliterate
+        self.max_segments = max_segments
+        self.over_budget = over_budget
+
+    def prepare(self, params):
+        """ Return `params`, a dict of values for Nexmo's send SMS API, with its encoding chosen. """
+        text = params.get("text")
+        if text is None or params.get("type") not in (None, "text", "unicode"):
+            return params
+        params = dict(params)
+        if params.get("type") is None:
+            if self.transliterate:
+                converted = transliterate(text)
+                if is_gsm(converted):
+                    text = params["text"] = converted
+            analysis = analyse(text)
+            params["type"] = analysis.type
+        elif self.max_segments is not None:
+            analysis = analyse(text)
+        else:
+            return params
+        if self.max_segments is not None and analysis.segments > self.max_segments:
+            message = (
+                "Message to {to} needs {segments} {encoding} segments, "
+                "more than {max_segments}."
+            ).format(
+                to=params.get("to"),
+                segments=analysis.segments,
+                encoding=analysis.encoding,
+                max_segments=self.max_segments,
+            )
+            if self.over_budget == "raise":
+                raise SegmentBudgetExceeded(message, analysis)
+            logger.warning(message)
+        return params
+
+
+_encoder = None
+
+
+def get_encoder():
+    """ Return the `Encoder` configured by the `NEXMO_ENCODING_OPTIONS` setting. """
+    global _encoder
+    if _encoder is None:
+        _encoder = Encoder(**getattr(settings, "NEXMO_ENCODING_OPTIONS", {}))
+    return _encoder
+
+
+@receiver(setting_changed)
+def _reset_encoder(setting, **kwargs):
+    global _encoder
+    if setting == "NEXMO_ENCODING_OPTIONS":
+        _encoder = None
@@ -0,0 +1,103 @@
+"""
+djnexmo.fields - model fields for storing phone numbers.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import signals
+
+import phonenumbers
+from phonenumbers import PhoneNumberFormat
+
+from .formatting import format_number, region_for_number
+
+
+def validate_phone_number(value):
+    """ Raise `ValidationError` if `value` isn't a phone number in international format. """
+    try:
+        format_number(value, PhoneNumberFormat.E164)
+    except phonenumbers.NumberParseException:
+        raise ValidationError(
+            "%(value)s is not a valid phone number.",
+            code="invalid_phone_number",
+            params={"value": value},
+        )
+
+
+class PhoneNumberField(models.CharField):
+    """
+    A phone number, stored in E.164 format, like "+447700900486".
+
+    Numbers are normalised when the model is saved, and can be given with
+    or without a leading "+". Like `ImageField`'s `width_field` and
+    `height_field`, the optional `national_field`, `international_field`
+    and `region_field` arguments name other fields on the model, which are
+    set to the number's national and international formats and its region
+    code when the model is saved, so they can be listed, indexed and
+    filtered on without parsing each number again. If a number can't be
+    parsed, it's saved as it is and those fields are set to `None`.
+    """
+
+    default_validators = [validate_phone_number]
+
+    def __init__(
+        self,
+        verbose_name=None,
+        name=None,
+        national_field=None,
+        international_field=None,
+        region_field=None,
+        **kwargs
+    ):
+        self.national_field = national_field
+        self.international_field = international_field
+        self.region_field = region_field
+        kwargs.setdefault("max_length", 24)
+        super().__init__(verbose_name, name, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get("max_length") == 24:
+            del kwargs["max_length"]
+        for attname in ("national_field", "international_field", "region_field"):
+            if getattr(self, attname):
+                kwargs[attname] = getattr(self, attname)
+        return name, path, args, kwargs
+
+    def normalize(self, value):
+        """ Return `value` in the E.164 format numbers are stored in, or as it is if it can't be parsed. """
+        if value:
+            try:
+                return format_number(value, PhoneNumberFormat.E164)
+            except phonenumbers.NumberParseException:
+                pass
+        return value
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        # The related fields may be declared before this one, and fields'
+        # `pre_save` methods are called in the order they're declared, so set
+        # them all from the model's `pre_save` signal instead:
+        if not cls._meta.abstract:
+            signals.pre_save.connect(self.update_number_fields, sender=cls)
+
+    def update_number_fields(self, instance, **kwargs):
+        """ Normalise the number on `instance`, and set its related fields. """
+        value = getattr(instance, self.attname)
+        national = international = region = None
+        if value:
+            try:
+                value = format_number(value, PhoneNumberFormat.E164)
+                national = format_number(value, PhoneNumberFormat.NATIONAL)
+                international = format_number(value, PhoneNumberFormat.INTERNATIONAL)
+                region = region_for_number(value)
+            except phonenumbers.NumberParseException:
+                pass
+            else:
+                setattr(instance, self.attname, value)
+        if self.national_field:
+            setattr(instance, self.national_field, national)
+        if self.international_field:
+            setattr(instance, self.international_field, international)
+        if self.region_field:
+            setattr(instance, self.region_field, region)
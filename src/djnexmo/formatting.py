@@ -0,0 +1,98 @@
+"""
+djnexmo.formatting - fast, cached formatting of phone numbers.
+
+Parsing a phone number with `phonenumbers` is relatively slow, so formatted
+numbers are kept in a bounded LRU cache, keyed by the normalised number and
+the format.
+"""
+
+from functools import lru_cache
+
+import phonenumbers
+from phonenumbers import PhoneMetadata, PhoneNumberFormat
+
+
+#: The maximum number of formatted numbers kept in the cache.
+CACHE_SIZE = 10000
+
+
+def normalize(value):
+    """ Normalise a number in international format, with or without a leading "+". """
+    value = value.strip()
+    if not value.startswith("+"):
+        value = "+" + value
+    return value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _format_normalized(value, number_format):
+    return phonenumbers.format_number(phonenumbers.parse(value), number_format)
+
+
+def format_number(value, number_format=PhoneNumberFormat.INTERNATIONAL):
+    """
+    Format `value`, a number in international format, with or without a leading "+".
+
+    `number_format` is a `phonenumbers.PhoneNumberFormat` value. Raises
+    `phonenumbers.NumberParseException` if the number can't be parsed.
+    """
+    return _format_normalized(normalize(value), number_format)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _region_for_normalized(value):
+    number = phonenumbers.parse(value)
+    # Fall back to the main region for the country code, because the numbers
+    # reserved for drama and testing don't belong to a region:
+    return phonenumbers.region_code_for_number(
+        number
+    ) or phonenumbers.region_code_for_country_code(number.country_code)
+
+
+def region_for_number(value):
+    """
+    Return the region code for `value`, such as "GB", or "ZZ" if it's unknown.
+
+    Raises `phonenumbers.NumberParseException` if the number can't be parsed.
+    """
+    return _region_for_normalized(normalize(value))
+
+
+def format_numbers(values, number_format=PhoneNumberFormat.INTERNATIONAL):
+    """
+    Format each of `values` in a single pass, returning a list of formatted numbers.
+
+    Each distinct number is only looked up once, however often it appears.
+    """
+    formatted = {}
+    results = []
+    for value in values:
+        result = formatted.get(value)
+        if result is None:
+            result = formatted[value] = format_number(value, number_format)
+        results.append(result)
+    return results
+
+
+def cache_info():
+    """ Return the hits, misses and size of the cache, as a `functools` `CacheInfo`. """
+    return _format_normalized.cache_info()
+
+
+def clear_cache():
+    """ Empty the cache. """
+    _format_normalized.cache_clear()
+    _region_for_normalized.cache_clear()
+
+
+def preload_regions(regions):
+    """
+    Load the `phonenumbers` metadata for each of `regions`, such as `["GB", "US"]`.
+
+    `phonenumbers` loads the metadata for each region the first time it's
+    used, so preloading saves the first request for each region from paying
+    for it.
+    """
+    for region in regions:
+        if PhoneMetadata.metadata_for_region(region.upper()) is None:
+            raise ValueError("Unknown region {region!r}".format(region=region))
@@ -0,0 +1,118 @@
+"""
+djnexmo.idempotency - detection of webhooks which Nexmo has already delivered.
+
+Nexmo retries webhooks which it thinks have failed, so the same message can be
+delivered more than once. `sms_webhook` records the `messageId` of each
+message it handles successfully in a `DeliveryLog`, and acknowledges repeat
+deliveries without handling them again. The log is configured with the
+`NEXMO_IDEMPOTENCY_OPTIONS` setting, a dict of keyword arguments used to
+construct it.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class ExpiringLRU:
+    """
+    A thread-safe set of at most `size` keys, each of which expires after `timeout` seconds.
+
+    When the set is full, the least recently used key is discarded.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._expiries = OrderedDict()
+
+    def __contains__(self, key):
+        with self._lock:
+            expiry = self._expiries.get(key)
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._expiries[key]
+                return False
+            self._expiries.move_to_end(key)
+            return True
+
+    def __len__(self):
+        return len(self._expiries)
+
+    def add(self, key):
+        with self._lock:
+            self._expiries[key] = time.monotonic() + self.timeout
+            self._expiries.move_to_end(key)
+            if len(self._expiries) > self.size:
+                self._expiries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._expiries.clear()
+
+
+class DeliveryLog:
+    """
+    Records the IDs of messages which have been handled.
+
+    IDs are held in an `ExpiringLRU` in the current process. If `cache` is
+    the alias of a Django cache, IDs are also stored there, so deliveries
+    handled by other processes are detected too.
+    """
+
+    def __init__(
+        self, size=10000, timeout=86400, cache=None, key_prefix="djnexmo:delivered"
+    ):
+        self.local = ExpiringLRU(size, timeout)
+        self.cache = caches[cache] if cache is not None else None
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def _cache_key(self, message_id):
+        return "{prefix}:{id}".format(prefix=self.key_prefix, id=message_id)
+
+    def seen(self, message_id):
+        """ Return `True` if `message_id` has been recorded. """
+        if message_id in self.local:
+            return True
+        if self.cache is not None and self.cache.get(self._cache_key(message_id)):
+            self.local.add(message_id)
+            return True
+        return False
+
+    def record(self, message_id):
+        """ Record that `message_id` has been handled. """
+        self.local.add(message_id)
+        if self.cache is not None:
+            self.cache.set(self._cache_key(message_id), True, self.timeout)
+
+    def clear(self):
+        """ Forget the messages recorded in this process. """
+        self.local.clear()
+
+
+_delivery_log = None
+
+
+def get_delivery_log():
+    """ Return the `DeliveryLog` configured by the `NEXMO_IDEMPOTENCY_OPTIONS` setting. """
+    global _delivery_log
+    if _delivery_log is None:
+        _delivery_log = DeliveryLog(
+            **getattr(settings, "NEXMO_IDEMPOTENCY_OPTIONS", {})
+        )
+    return _delivery_log
+
+
+@receiver(setting_changed)
+def _reset_delivery_log(setting, **kwargs):
+    global _delivery_log
+    if setting == "NEXMO_IDEMPOTENCY_OPTIONS":
+        _delivery_log = None
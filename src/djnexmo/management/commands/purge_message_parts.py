@@ -0,0 +1,140 @@
+"""
+Delete the stored parts of multi-part SMS messages which were never completed.
+"""
+
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from djnexmo.decorators import deliver_partial_message
+from djnexmo.models import SMSMessagePart
+
+
+AGE_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_age(value):
+    """ Parse an age such as `90s`, `30m`, `12h` or `7d` into a `timedelta`. """
+    match = re.fullmatch(r"(\d+)([smhd])", value.strip())
+    if match is None:
+        raise ValueError(value)
+    return timedelta(**{AGE_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def messages_of(parts):
+    """ Return a queryset of every stored part of the messages which have a part in `parts`. """
+    same_message = parts.filter(
+        msisdn=OuterRef("msisdn"), to=OuterRef("to"), concat_ref=OuterRef("concat_ref")
+    )
+    return (
+        SMSMessagePart.objects.annotate(selected=Exists(same_message))
+        .filter(selected=True)
+        .order_by()
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the parts of multi-part SMS messages which were never completed. "
+        "Each message with a part older than --older-than is deleted whole. The "
+        "old parts are found in batches of consecutive primary keys, so the table "
+        "isn't locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=parse_age,
+            default=timedelta(days=1),
+            help="Delete messages with a part received longer ago than this, such as 30m, 12h or 7d. Defaults to 1d.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The maximum number of old parts whose messages are deleted by each query. Defaults to 1000.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the parts which would be deleted, without deleting them.",
+        )
+        parser.add_argument(
+            "--deliver-partial",
+            action="store_true",
+            help=(
+                "Pass the incomplete messages to the handler named by the "
+                "NEXMO_PARTIAL_MESSAGE_HANDLER setting before deleting them."
+            ),
+        )
+
+    def handle(
+        self, *args, older_than, batch_size, dry_run, deliver_partial, **options
+    ):
+        stale = SMSMessagePart.objects.filter(
+            timestamp__lt=timezone.now() - older_than
+        ).order_by()
+
+        if dry_run:
+            self.stdout.write(
+                "{count} message parts would be deleted.".format(
+                    count=messages_of(stale).count()
+                )
+            )
+            return
+
+        handler = None
+        if deliver_partial:
+            handler_path = getattr(settings, "NEXMO_PARTIAL_MESSAGE_HANDLER", None)
+            if handler_path is None:
+                raise CommandError(
+                    "--deliver-partial requires the NEXMO_PARTIAL_MESSAGE_HANDLER setting."
+                )
+            handler = import_string(handler_path)
+
+        deleted = 0
+        last_pk = None
+        while True:
+            batch = stale if last_pk is None else stale.filter(pk__gt=last_pk)
+            # Find the primary key which ends this batch, without loading the batch:
+            upper = list(
+                batch.order_by("pk").values_list("pk", flat=True)[
+                    batch_size - 1 : batch_size
+                ]
+            )
+            if upper:
+                batch = batch.filter(pk__lte=upper[0])
+            deleted += self.purge(batch, handler)
+            if not upper:
+                break
+            last_pk = upper[0]
+
+        self.stdout.write("Deleted {count} message parts.".format(count=deleted))
+
+    def purge(self, batch, handler):
+        """
+        Delete every part of each message with a part in `batch`, passing the message to `handler` first if it's given.
+
+        Parts which arrived since the cutoff are deleted with the rest of
+        their message, as it could never be reassembled without the others.
+        See `djnexmo.decorators.deliver_partial_message`.
+        """
+        parts = messages_of(batch)
+        if handler is None:
+            pks = list(parts.values_list("pk", flat=True))
+        else:
+            pks = []
+            parts = parts.order_by("msisdn", "to", "concat_ref", "concat_part")
+            for _, message in groupby(parts, attrgetter("msisdn", "to", "concat_ref")):
+                message = list(message)
+                deliver_partial_message(message, handler)
+                pks.extend(part.pk for part in message)
+        # MySQL can't delete from a table read by a subquery, so delete them by primary key:
+        return SMSMessagePart.objects.filter(pk__in=pks).delete()[0]
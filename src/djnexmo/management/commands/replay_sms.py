@@ -0,0 +1,251 @@
+"""
+Replay a file of inbound SMS webhook payloads through a view decorated with `sms_webhook`.
+"""
+
+from collections import Counter
+import logging
+import multiprocessing
+import os
+import queue
+import time
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import NoReverseMatch, resolve, reverse
+from django.utils.module_loading import import_string
+
+from djnexmo import workers
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_view(name):
+    """ Return the path and view for `name`, a URL pattern name or the dotted path of a view. """
+    try:
+        path = reverse(name)
+    except NoReverseMatch:
+        try:
+            return "/", import_string(name)
+        except ImportError:
+            raise CommandError(
+                "{name} is neither a URL pattern name nor a view.".format(name=name)
+            )
+    return path, resolve(path).func
+
+
+def read_lines(path, start, end):
+    """
+    Yield the lines of the file at `path` which start between the byte offsets `start` and `end`.
+
+    The file is read a buffer at a time, so it's never held in memory.
+    Splitting a file at arbitrary offsets yields each line exactly once.
+    """
+    with open(path, "rb") as f:
+        if start > 0:
+            # Skip the rest of the line which started before `start`:
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                return
+            yield line
+
+
+def replay(path, start, end, view_name, report, report_interval=0.5):
+    """
+    Send each payload in the lines of `path` between `start` and `end` to the view named `view_name`.
+
+    `report` is called with events: `("progress", counts)` at most every
+    `report_interval` seconds, where `counts` maps each response status code
+    (or "error", if the view raised an exception) to the number of payloads
+    since the last report; `("failed", line)` for each payload which wasn't
+    handled successfully; and `("done", None)` once every payload has been sent.
+    """
+    url, view = load_view(view_name)
+    factory = RequestFactory()
+    counts = Counter()
+    reported = time.monotonic()
+    try:
+        for line in read_lines(path, start, end):
+            if not line.strip():
+                continue
+            request = factory.post(url, data=line, content_type="application/json")
+            try:
+                response = view(request)
+            except Exception:
+                logger.exception("Failed to replay a payload.")
+                outcome = "error"
+            else:
+                outcome = getattr(response, "status_code", 200)
+            counts[outcome] += 1
+            if outcome == "error" or outcome >= 400:
+                report(("failed", line))
+            if time.monotonic() - reported >= report_interval:
+                report(("progress", dict(counts)))
+                counts.clear()
+                reported = time.monotonic()
+    finally:
+        report(("progress", dict(counts)))
+        report(("done", None))
+
+
+def _replay_worker(events, *args):
+    # Processes which are spawned rather than forked start without Django set up:
+    if not apps.ready:
+        django.setup()
+    try:
+        replay(*args, report=events.put)
+    finally:
+        # Worker processes exit without running `atexit` handlers:
+        workers.drain()
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Send each webhook payload in a file of JSON lines to a view decorated with "
+        "sms_webhook, from a pool of worker processes, reporting throughput and "
+        "failures as it goes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "view",
+            help="The URL pattern name or dotted path of a view decorated with sms_webhook.",
+        )
+        parser.add_argument(
+            "file", help="A file containing a webhook payload on each line."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help=(
+                "The number of worker processes, each with its own database "
+                "connections. With 1, payloads are sent from this process. "
+                "Defaults to the number of CPUs."
+            ),
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="The number of seconds between progress reports. Defaults to 2.",
+        )
+        parser.add_argument(
+            "--failures",
+            help="Write the payloads which weren't handled successfully to this file, to replay them later.",
+        )
+
+    def handle(self, *args, view, file, workers, interval, failures, **options):
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        try:
+            size = os.path.getsize(file)
+        except OSError as e:
+            raise CommandError(str(e))
+        load_view(view)
+
+        self.counts = Counter()
+        self.interval = interval
+        self.started = self.reported = time.monotonic()
+        self.failures = open(failures, "wb") if failures else None
+        try:
+            if workers == 1:
+                replay(file, 0, size, view, self.report)
+            else:
+                self.run_workers(file, size, view, workers)
+        finally:
+            if self.failures is not None:
+                self.failures.close()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            "Replayed {total} payloads in {elapsed:.1f}s ({rate:.0f}/s), {failed} failed. "
+            "Responses: {statuses}.".format(
+                total=sum(self.counts.values()),
+                elapsed=elapsed,
+                rate=sum(self.counts.values()) / elapsed if elapsed else 0,
+                failed=self.failed(),
+                statuses=", ".join(
+                    "{outcome}: {count}".format(outcome=outcome, count=count)
+                    for outcome, count in sorted(
+                        self.counts.items(), key=lambda item: str(item[0])
+                    )
+                )
+                or "none",
+            )
+        )
+
+    def run_workers(self, file, size, view, workers):
+        # Workers mustn't share the connections of this process:
+        connections.close_all()
+        context = multiprocessing.get_context()
+        events = context.Queue()
+        processes = [
+            context.Process(
+                target=_replay_worker,
+                args=(
+                    events,
+                    file,
+                    size * index // workers,
+                    size * (index + 1) // workers,
+                    view,
+                ),
+                daemon=True,
+            )
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        running = workers
+        while running:
+            try:
+                event = events.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break
+                continue
+            if event[0] == "done":
+                running -= 1
+            else:
+                self.report(event)
+        for process in processes:
+            process.join()
+        if running:
+            raise CommandError(
+                "{count} worker processes exited unexpectedly.".format(count=running)
+            )
+
+    def failed(self):
+        return sum(
+            count
+            for outcome, count in self.counts.items()
+            if outcome == "error" or outcome >= 400
+        )
+
+    def report(self, event):
+        kind, value = event
+        if kind == "failed":
+            if self.failures is not None:
+                self.failures.write(value.rstrip(b"\r\n") + b"\n")
+            return
+        if kind != "progress":
+            return
+        self.counts.update(value)
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            total = sum(self.counts.values())
+            self.stdout.write(
+                "{total} payloads, {rate:.0f}/s, {failed} failed".format(
+                    total=total,
+                    rate=total / (now - self.started),
+                    failed=self.failed(),
+                )
+            )
+            self.reported = now
@@ -0,0 +1,301 @@
+"""
+djnexmo.metrics - timings and counters for the webhook pipeline.
+
+`sms_webhook` and `dlr_webhook` report how long each stage of handling a
+webhook takes with the `webhook_stage_timed` signal, and notable events with
+the `webhook_event` signal. Each metric is labelled with the name of the
+decorator which sent it, such as "sms_webhook". If the `NEXMO_METRICS` setting is `True`, these are
+recorded in `registry`, an in-process registry of counters, gauges and
+histograms, which `djnexmo.views.prometheus_metrics` exposes in
+Prometheus' text format. To send them elsewhere, connect your own receivers
+to the signals. Stages aren't timed at all while nothing is connected.
+
+Like every metric in `registry`, `parts_pending` only counts what this process
+has done. A message's parts may be stored by one process and reassembled by
+another, so its value in a single process can be negative, and only the sum
+across processes is meaningful.
+"""
+
+from bisect import bisect_left
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .signals import webhook_event, webhook_stage_timed
+
+
+#: The default upper bounds of histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{{{labels}}}".format(
+        labels=",".join(
+            '{name}="{value}"'.format(
+                name=name,
+                value=str(value)
+                .replace("\\", r"\\")
+                .replace("\n", r"\n")
+                .replace('"', r"\""),
+            )
+            for name, value in pairs
+        )
+    )
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """ Base class for metrics, which hold a value for each combination of label values. """
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """ Yield a (name, label string, value) tuple for each sample of this metric. """
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labels, key), value
+
+    def expose(self):
+        """ Return this metric in Prometheus' text exposition format. """
+        lines = [
+            "# HELP {name} {help}".format(name=self.name, help=self.help),
+            "# TYPE {name} {type}".format(name=self.name, type=self.type),
+        ]
+        for name, labels, value in self.samples():
+            lines.append(
+                "{name}{labels} {value}".format(
+                    name=name, labels=labels, value=_format_value(value)
+                )
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """ A value which only goes up. """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    """ A value which can go up and down. """
+
+    type = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """ Counts observations in buckets with the upper bounds `buckets`, and their sum. """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # A count for each bucket, then one for +Inf, then the sum:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(self._key(labels))
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(bound)
+                yield (
+                    self.name + "_bucket",
+                    _format_labels(self.labels, key, [("le", le)]),
+                    cumulative,
+                )
+            labels = _format_labels(self.labels, key)
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, counts[-1]
+
+
+class Registry:
+    """ A collection of metrics, which can be exposed together. """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def clear(self):
+        """ Reset every metric. """
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def expose(self):
+        """ Return every metric in Prometheus' text exposition format. """
+        return "".join(metric.expose() + "\n" for metric in self._metrics.values())
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "djnexmo_webhook_stage_seconds",
+    "Time spent in each stage of handling a webhook.",
+    labels=("webhook", "stage"),
+)
+signatures_rejected = registry.counter(
+    "djnexmo_webhook_signatures_rejected_total",
+    "Webhooks rejected because of an invalid signature.",
+    labels=("webhook",),
+)
+duplicate_deliveries = registry.counter(
+    "djnexmo_webhook_duplicate_deliveries_total",
+    "Repeat deliveries of messages which had already been handled.",
+    labels=("webhook",),
+)
+duplicate_parts = registry.counter(
+    "djnexmo_webhook_duplicate_parts_total",
+    "Message parts which had already been stored.",
+    labels=("webhook",),
+)
+messages_reassembled = registry.counter(
+    "djnexmo_webhook_messages_reassembled_total",
+    "Multi-part messages which have been reassembled.",
+    labels=("webhook",),
+)
+parts_pending = registry.gauge(
+    "djnexmo_webhook_parts_pending",
+    "Message parts stored by this process, less those it has reassembled. "
+    "May be negative; the sum over every process is the number waiting to be reassembled.",
+)
+
+
+class StageTimer:
+    """
+    Times the consecutive stages of handling a webhook.
+
+    Each call to `lap` sends `webhook_stage_timed` from `sender`, the
+    decorator which made the view, with the time since the previous lap. If
+    nothing is connected to the signal when the timer is created, nothing
+    is timed.
+    """
+
+    __slots__ = ("_sender", "_last")
+
+    def __init__(self, sender):
+        self._sender = sender
+        self._last = time.perf_counter() if webhook_stage_timed.receivers else None
+
+    def lap(self, stage):
+        if self._last is not None:
+            now = time.perf_counter()
+            webhook_stage_timed.send(
+                sender=self._sender, stage=stage, duration=now - self._last
+            )
+            self._last = now
+
+
+def _record_stage(sender, stage, duration, **kwargs):
+    stage_seconds.observe(duration, webhook=sender.__name__, stage=stage)
+
+
+_EVENT_COUNTERS = {
+    "signature_rejected": signatures_rejected,
+    "duplicate_delivery": duplicate_deliveries,
+    "duplicate_part": duplicate_parts,
+}
+
+
+def _record_event(sender, event, parts=1, **kwargs):
+    if event == "part_stored":
+        parts_pending.inc()
+    elif event == "message_reassembled":
+        messages_reassembled.inc(webhook=sender.__name__)
+        # The final part was never counted as pending:
+        parts_pending.dec(parts - 1)
+    else:
+        counter = _EVENT_COUNTERS.get(event)
+        # Other events may be sent by receivers outside djnexmo:
+        if counter is not None:
+            counter.inc(webhook=sender.__name__)
+
+
+def enable():
+    """ Record the webhook signals in `registry`. """
+    webhook_stage_timed.connect(_record_stage, dispatch_uid="djnexmo.metrics")
+    webhook_event.connect(_record_event, dispatch_uid="djnexmo.metrics")
+
+
+def disable():
+    """ Stop recording the webhook signals in `registry`. """
+    webhook_stage_timed.disconnect(dispatch_uid="djnexmo.metrics")
+    webhook_event.disconnect(dispatch_uid="djnexmo.metrics")
+
+
+def configure():
+    """ Enable or disable recording metrics according to the `NEXMO_METRICS` setting. """
+    if getattr(settings, "NEXMO_METRICS", False):
+        enable()
+    else:
+        disable()
+
+
+@receiver(setting_changed)
+def _reset_metrics(setting, **kwargs):
+    if setting == "NEXMO_METRICS":
+        configure()
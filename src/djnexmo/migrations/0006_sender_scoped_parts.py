@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("djnexmo", "0005_auto_20180430_1523")]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="smsmessagepart",
+            options={
+                "verbose_name": "Message Part",
+                "verbose_name_plural": "Message Parts",
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name="smsmessagepart",
+            unique_together={("msisdn", "to", "concat_ref", "concat_part")},
+        ),
+    ]
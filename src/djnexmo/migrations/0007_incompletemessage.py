@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djnexmo", "0006_sender_scoped_parts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IncompleteMessage",
+            fields=[],
+            options={
+                "verbose_name": "Incomplete Message",
+                "verbose_name_plural": "Incomplete Messages",
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("djnexmo.smsmessagepart",),
+        ),
+    ]
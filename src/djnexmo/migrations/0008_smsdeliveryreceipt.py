@@ -0,0 +1,44 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djnexmo", "0007_incompletemessage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SMSDeliveryReceipt",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("message_id", models.CharField(db_index=True, max_length=32)),
+                ("msisdn", models.CharField(db_index=True, max_length=24)),
+                ("to", models.CharField(max_length=24)),
+                ("network_code", models.CharField(max_length=16, null=True)),
+                (
+                    "price",
+                    models.DecimalField(decimal_places=8, max_digits=12, null=True),
+                ),
+                ("status", models.CharField(max_length=16)),
+                ("err_code", models.CharField(max_length=8, null=True)),
+                ("scts", models.DateTimeField(null=True)),
+                ("message_timestamp", models.DateTimeField(null=True)),
+                ("client_ref", models.CharField(max_length=40, null=True)),
+            ],
+            options={
+                "verbose_name": "Delivery Receipt",
+                "verbose_name_plural": "Delivery Receipts",
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:15
+
+from django.db import migrations, models
+import djnexmo.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djnexmo", "0008_smsdeliveryreceipt"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedMessage",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("message_id", models.CharField(max_length=32, unique=True)),
+                (
+                    "msisdn",
+                    djnexmo.fields.PhoneNumberField(
+                        db_index=True, region_field="region"
+                    ),
+                ),
+                ("region", models.CharField(db_index=True, max_length=3, null=True)),
+                ("to", models.CharField(max_length=24)),
+                ("text", models.TextField(null=True)),
+                ("data", models.BinaryField(null=True)),
+                ("udh", models.BinaryField(null=True)),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("text", "Text"),
+                            ("unicode", "Unicode"),
+                            ("binary", "Binary"),
+                        ],
+                        max_length=7,
+                    ),
+                ),
+                ("keyword", models.CharField(max_length=160, null=True)),
+                ("message_timestamp", models.DateTimeField()),
+                ("timestamp", models.DateTimeField()),
+                ("concat_ref", models.CharField(max_length=32, null=True)),
+                ("parts", models.IntegerField(default=1)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Archived Message",
+                "verbose_name_plural": "Archived Messages",
+            },
+        ),
+    ]
@@ -1,22 +1,23 @@
 from django.db import models
+from django.db.models import Count, Exists, Min, OuterRef, Subquery
+
+from .fields import PhoneNumberField
 
 
 class SMSMessagePart(models.Model):
 
     class Meta:
-        ordering = ("-concat_ref", "concat_part")
-        unique_together = ("concat_ref", "concat_part")
+        # `concat_ref` is only unique for each sender and recipient, and the
+        # index on this constraint serves the lookup of a message's parts:
+        unique_together = ("msisdn", "to", "concat_ref", "concat_part")
         verbose_name = "Message Part"
         verbose_name_plural = "Message Parts"
 
-    concat_ref = models.CharField(max_length=32, db_index=True)
-
     message_id = models.CharField(max_length=32, unique=True)
     msisdn = models.CharField(max_length=24)
     to = models.CharField(max_length=24)
 
     text = models.CharField(max_length=160, null=True)
-    # TODO: Need to do something with these:
     data = models.BinaryField(max_length=160, null=True)
     udh = models.BinaryField(max_length=160, null=True)
 
@@ -38,3 +39,108 @@ class SMSMessagePart(models.Model):
                 self=self,
             )
         )
+
+
+class SMSDeliveryReceipt(models.Model):
+
+    class Meta:
+        verbose_name = "Delivery Receipt"
+        verbose_name_plural = "Delivery Receipts"
+
+    message_id = models.CharField(max_length=32, db_index=True)
+    msisdn = models.CharField(max_length=24, db_index=True)
+    to = models.CharField(max_length=24)
+    network_code = models.CharField(max_length=16, null=True)
+    price = models.DecimalField(max_digits=12, decimal_places=8, null=True)
+    status = models.CharField(max_length=16)
+    err_code = models.CharField(max_length=8, null=True)
+    scts = models.DateTimeField(null=True)
+    message_timestamp = models.DateTimeField(null=True)
+    client_ref = models.CharField(max_length=40, null=True)
+
+    def __str__(self):
+        return "Message {self.message_id} to {self.msisdn}: {self.status}".format(
+            self=self
+        )
+
+
+class ArchivedMessage(models.Model):
+
+    class Meta:
+        verbose_name = "Archived Message"
+        verbose_name_plural = "Archived Messages"
+
+    message_id = models.CharField(max_length=32, unique=True)
+    msisdn = PhoneNumberField(region_field="region", db_index=True)
+    region = models.CharField(max_length=3, null=True, db_index=True)
+    to = models.CharField(max_length=24)
+
+    text = models.TextField(null=True)
+    data = models.BinaryField(null=True)
+    udh = models.BinaryField(null=True)
+    type = models.CharField(
+        max_length=7,
+        choices=[("text", "Text"), ("unicode", "Unicode"), ("binary", "Binary")],
+    )
+    keyword = models.CharField(max_length=160, null=True)
+    message_timestamp = models.DateTimeField()
+    timestamp = models.DateTimeField()
+
+    concat_ref = models.CharField(max_length=32, null=True)
+    parts = models.IntegerField(default=1)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "Message {self.message_id} from {self.msisdn}: {self.text!r}".format(
+            self=self
+        )
+
+
+class IncompleteMessageManager(models.Manager):
+    def get_queryset(self):
+        """
+        Return the first part of each incomplete message, annotated with the
+        number of parts received and when the first of them arrived.
+        """
+        group = (
+            SMSMessagePart.objects.filter(
+                msisdn=OuterRef("msisdn"),
+                to=OuterRef("to"),
+                concat_ref=OuterRef("concat_ref"),
+            )
+            .order_by()
+            .values("concat_ref")
+        )
+        return (
+            super()
+            .get_queryset()
+            .annotate(
+                parts_received=Subquery(
+                    group.annotate(received=Count("pk")).values("received"),
+                    output_field=models.IntegerField(),
+                ),
+                first_received=Subquery(
+                    group.annotate(first=Min("timestamp")).values("first"),
+                    output_field=models.DateTimeField(),
+                ),
+                has_earlier_part=Exists(group.filter(pk__lt=OuterRef("pk"))),
+            )
+            .filter(has_earlier_part=False)
+        )
+
+
+class IncompleteMessage(SMSMessagePart):
+    """ A multi-part message which hasn't been completed, represented by its first stored part. """
+
+    class Meta:
+        proxy = True
+        verbose_name = "Incomplete Message"
+        verbose_name_plural = "Incomplete Messages"
+
+    objects = IncompleteMessageManager()
+
+    def parts(self):
+        """ Return a queryset of the stored parts of this message. """
+        return SMSMessagePart.objects.filter(
+            msisdn=self.msisdn, to=self.to, concat_ref=self.concat_ref
+        ).order_by("concat_part")
@@ -0,0 +1,182 @@
+"""
+djnexmo.outbound - a background queue for sending SMS messages.
+
+Messages passed to `send` are sent by a pool of worker threads, so sending a
+message doesn't hold up the request which sent it. The queue is configured
+with the `NEXMO_OUTBOUND_OPTIONS` setting, a dict of keyword arguments used to
+construct the `OutboundQueue`.
+"""
+
+from concurrent.futures import Future
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+import nexmo
+
+from . import client
+from .encoding import get_encoder
+from .signals import message_failed, message_sent
+from .workers import Shared, WorkerPool
+
+
+logger = logging.getLogger(__name__)
+
+#: The status Nexmo's SMS API reports for a message when the account's throughput limit is exceeded.
+STATUS_THROTTLED = "1"
+
+
+class SendError(Exception):
+    """ Raised when Nexmo rejects a message, with the status code Nexmo reported. """
+
+    def __init__(self, message, status, response=None):
+        super().__init__(message)
+        self.status = status
+        self.response = response
+
+
+class TokenBucket:
+    """
+    A thread-safe rate limiter, allowing `rate` acquisitions per second.
+
+    Up to `burst` acquisitions can be made at once after a quiet period.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Block until a token is available, and take it. """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_retryable(exception):
+    if isinstance(exception, nexmo.ServerError):
+        return True
+    if isinstance(exception, nexmo.ClientError):
+        return str(exception).startswith("429 ")
+    if isinstance(exception, SendError):
+        return exception.status == STATUS_THROTTLED
+    return False
+
+
+def _check_response(response):
+    """ Raise `SendError` if Nexmo's response reports a message wasn't accepted. """
+    if not isinstance(response, dict):
+        return
+    for message in response.get("messages", []):
+        status = message.get("status", "0")
+        if status != "0":
+            raise SendError(
+                "Message rejected: {text} (status {status})".format(
+                    text=message.get("error-text", "unknown error"), status=status
+                ),
+                status,
+                response,
+            )
+
+
+class OutboundQueue(WorkerPool):
+    """
+    Sends messages from a pool of worker threads.
+
+    Sending is limited to `rate` messages per second (unlimited if `None`),
+    matching the throughput allowed for your Nexmo account. Messages which
+    fail because of throttling or a server error are retried up to `retries`
+    times, waiting `backoff` seconds before the first retry and doubling the
+    wait for each retry after that. Messages still queued when the process
+    exits are sent before it exits.
+    """
+
+    thread_name = "djnexmo-outbound"
+
+    def __init__(
+        self, workers=2, rate=None, burst=1, retries=3, backoff=0.5, queue_size=10000
+    ):
+        super().__init__(workers, queue_size)
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = TokenBucket(rate, burst) if rate else None
+
+    def send(self, params, callback=None):
+        """
+        Queue `params`, a dict of values for Nexmo's send SMS API, to be sent.
+
+        Returns a `concurrent.futures.Future`, which resolves to Nexmo's
+        response once the message has been sent. If `callback` is provided,
+        it's called with the future when the message has been sent or has
+        failed. This blocks if the queue is full.
+
+        If `params` has no `type`, it's chosen from the text by the `Encoder`
+        configured by `NEXMO_ENCODING_OPTIONS`, which may raise
+        `djnexmo.encoding.SegmentBudgetExceeded`.
+        """
+        params = get_encoder().prepare(params)
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        self._put((params, future))
+        return future
+
+    def _handle(self, item):
+        params, future = item
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                # `send_message` adds authentication to the dict it's given:
+                response = client.send_message(dict(params))
+                _check_response(response)
+            except Exception as e:
+                if attempt < self.retries and _is_retryable(e):
+                    logger.info("Retrying message to %s: %s", params.get("to"), e)
+                    time.sleep(self.backoff * 2 ** attempt)
+                    continue
+                logger.warning("Failed to send message to %s: %s", params.get("to"), e)
+                future.set_exception(e)
+                message_failed.send(sender=self.__class__, params=params, exception=e)
+                return
+            future.set_result(response)
+            message_sent.send(sender=self.__class__, params=params, response=response)
+            return
+
+
+_outbound_queue = Shared(
+    lambda: OutboundQueue(**getattr(settings, "NEXMO_OUTBOUND_OPTIONS", {})),
+    ["NEXMO_OUTBOUND_OPTIONS"],
+)
+
+
+def get_outbound_queue():
+    """ Return the `OutboundQueue` configured by the `NEXMO_OUTBOUND_OPTIONS` setting. """
+    return _outbound_queue.get()
+
+
+def send(params, callback=None):
+    """
+    Queue an SMS message to be sent in the background.
+
+    Example::
+
+        djnexmo.send({"to": "447700900301", "from": "447700900414", "text": "Hello!"})
+
+    See `OutboundQueue.send` for details.
+    """
+    return get_outbound_queue().send(params, callback)
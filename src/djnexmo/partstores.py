@@ -0,0 +1,299 @@
+"""
+djnexmo.partstores - storage backends for the parts of concatenated SMS messages.
+
+Parts are held by a `PartStore` until all the parts of a message have arrived.
+The store used by `sms_webhook` is configured with the `NEXMO_PART_STORE`
+setting, a dotted path to a `PartStore` subclass, and the optional
+`NEXMO_PART_STORE_OPTIONS` setting, a dict of keyword arguments used to
+construct it.
+"""
+
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import IntegrityError, router, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import SMSMessagePart
+
+
+DEFAULT_PART_STORE = "djnexmo.partstores.ModelPartStore"
+
+
+class DuplicatePart(Exception):
+    """ Raised when a message part has already been stored. """
+
+
+class _PartsTaken(Exception):
+    """ Raised inside a transaction to roll it back when parts were deleted by another request. """
+
+
+# The fields which identify a part of a message:
+_PART_KEY = ("msisdn", "to", "concat_ref", "concat_part")
+
+
+class PartStore:
+    """ Base class for backends which store message parts until a message is complete. """
+
+    def add(self, sms):
+        """
+        Store `sms`, an `IncomingSMS` part of a concatenated message.
+
+        If `sms` completes its message, the stored parts are removed from the
+        store and returned as a list ordered by `concat_part`. Each part has
+        the same attributes as `IncomingSMS`. If the message is incomplete
+        then `None` is returned. Implementations must ensure that the parts
+        of a message are returned exactly once, even when its last parts
+        are stored concurrently.
+
+        Raises `DuplicatePart` if the part has already been stored.
+        """
+        raise NotImplementedError()
+
+    def add_many(self, messages):
+        """
+        Store each of `messages`, a list of `IncomingSMS` parts of concatenated messages.
+
+        Returns a list with an item for each part: the parts of its message
+        if it completed one, otherwise `None`, or a `DuplicatePart` instance
+        if it had already been stored. By default `add` is called for each
+        part.
+        """
+        results = []
+        for sms in messages:
+            try:
+                results.append(self.add(sms))
+            except DuplicatePart as e:
+                results.append(e)
+        return results
+
+
+class ModelPartStore(PartStore):
+    """
+    Stores message parts in the database, using the `SMSMessagePart` model.
+
+    A message's parts are identified by their sender, recipient and
+    `concat_ref`, which are the leading columns of the model's unique index.
+
+    Each part is committed before the parts of its message are read back, so
+    the last of several concurrent requests to commit always sees every part.
+    Requests which see a complete message race to delete its parts, and only
+    the request whose single `DELETE` removes all of them returns them.
+    Storing a part costs an `INSERT` and a `SELECT`, plus a `DELETE` for the
+    part which completes its message.
+
+    Parts are only visible to other requests once they are committed, so the
+    store must not be used inside a transaction, or the final part of a
+    message may not be detected. Views made by `sms_webhook` are exempt from
+    `ATOMIC_REQUESTS` for this reason.
+    """
+
+    def add(self, sms):
+        # Reads go to the same database as writes, so a replica can't lag behind:
+        using = router.db_for_write(SMSMessagePart)
+        part = sms.to_model()
+        try:
+            if transaction.get_connection(using).in_atomic_block:
+                # A savepoint is needed so the outer transaction survives a duplicate:
+                with transaction.atomic(using=using):
+                    part.save(using=using)
+            else:
+                part.save(using=using)
+        except IntegrityError:
+            raise DuplicatePart()
+        return self._take_parts(sms, using)
+
+    def add_many(self, messages):
+        """
+        Store each of `messages` with set-based queries.
+
+        New parts are inserted with a single `bulk_create`, and committed
+        before the groups they belong to are read back, as with `add`. Then
+        the complete groups are read with a single locking `SELECT` and
+        removed with a single `DELETE`, so storing a batch of parts costs
+        four queries in two transactions, however many parts it contains.
+        If another request stores or takes the same parts at the same time,
+        the parts or groups involved are handled one at a time instead.
+        """
+        using = router.db_for_write(SMSMessagePart)
+        results = [None] * len(messages)
+        keys = [
+            (sms.msisdn, sms.to, sms.concat_ref, sms.concat_part) for sms in messages
+        ]
+        new = []
+        try:
+            with transaction.atomic(using=using):
+                stored = set(self._group_parts(messages, using).values_list(*_PART_KEY))
+                for index, (sms, key) in enumerate(zip(messages, keys)):
+                    if key in stored:
+                        results[index] = DuplicatePart()
+                    else:
+                        stored.add(key)
+                        new.append((index, sms.to_model()))
+                SMSMessagePart.objects.using(using).bulk_create(
+                    [part for _, part in new]
+                )
+        except IntegrityError:
+            # Another request stored some of the same parts, so find out which:
+            for index, part in new:
+                try:
+                    with transaction.atomic(using=using):
+                        part.save(using=using)
+                except IntegrityError:
+                    results[index] = DuplicatePart()
+
+        # The last new part of each group is the one which completes it:
+        last_new = {}
+        for index, (result, key) in enumerate(zip(results, keys)):
+            if result is None:
+                last_new[key[:3]] = index
+        for attempt in range(3):
+            try:
+                with transaction.atomic(using=using):
+                    complete = self._take_complete_groups(messages, last_new, using)
+            except _PartsTaken:
+                # Another request took some of the parts, so read them again:
+                continue
+            for group, parts in complete:
+                results[last_new[group]] = parts
+            return results
+        # Take each group on its own, so contention over one can't hold up the rest:
+        for index in last_new.values():
+            results[index] = self._take_parts(messages[index], using)
+        return results
+
+    def _group_parts(self, messages, using):
+        """ Return a queryset containing at least the stored parts of the groups of `messages`. """
+        return SMSMessagePart.objects.using(using).filter(
+            msisdn__in={sms.msisdn for sms in messages},
+            concat_ref__in={sms.concat_ref for sms in messages},
+        )
+
+    def _take_complete_groups(self, messages, groups, using):
+        complete = []
+        by_group = {}
+        parts = self._group_parts(messages, using).select_for_update()
+        for part in parts.order_by("concat_part"):
+            group = (part.msisdn, part.to, part.concat_ref)
+            if group in groups:
+                by_group.setdefault(group, []).append(part)
+        for group, parts in by_group.items():
+            if len(parts) == parts[0].concat_total:
+                complete.append((group, parts))
+        pks = [part.pk for _, parts in complete for part in parts]
+        if pks:
+            taken = SMSMessagePart.objects.using(using).filter(pk__in=pks)
+            if taken.delete()[0] != len(pks):
+                raise _PartsTaken()
+        return complete
+
+    def _take_parts(self, sms, using):
+        matching_parts = SMSMessagePart.objects.using(using).filter(
+            msisdn=sms.msisdn, to=sms.to, concat_ref=sms.concat_ref
+        )
+        parts = list(matching_parts.order_by("concat_part"))
+        if len(parts) != sms.concat_total:
+            return None
+        # SMSMessagePart has no relations or delete signals, so this is a single DELETE:
+        if matching_parts.delete()[0] != len(parts):
+            # Another request completed the message first.
+            return None
+        return parts
+
+
+class CachePartStore(PartStore):
+    """
+    Stores message parts in a Django cache.
+
+    Each part is stored under its own key with `cache.add`, and the parts
+    received for a message are counted with `cache.incr`, so the cache backend
+    must implement both atomically (memcached, Redis and the local-memory
+    cache all do). Parts of messages which are never completed expire after
+    `timeout` seconds.
+    """
+
+    def __init__(self, cache="default", timeout=86400, key_prefix="djnexmo:parts"):
+        self.cache = caches[cache]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def _group_key(self, sms):
+        return "{prefix}:{sms.msisdn}:{sms.to}:{sms.concat_ref}".format(
+            prefix=self.key_prefix, sms=sms
+        )
+
+    def add(self, sms):
+        group_key = self._group_key(sms)
+        part_key = "{group}:{part}".format(group=group_key, part=sms.concat_part)
+        if not self.cache.add(part_key, sms, self.timeout):
+            raise DuplicatePart()
+
+        self.cache.add(group_key, 0, self.timeout)
+        try:
+            count = self.cache.incr(group_key)
+        except ValueError:
+            # The counter expired between being added and incremented:
+            self.cache.add(group_key, 0, self.timeout)
+            count = self.cache.incr(group_key)
+        if count != sms.concat_total:
+            return None
+
+        part_keys = [
+            "{group}:{part}".format(group=group_key, part=part)
+            for part in range(1, sms.concat_total + 1)
+        ]
+        parts = self.cache.get_many(part_keys)
+        self.cache.delete_many(part_keys + [group_key])
+        if len(parts) != len(part_keys):
+            # Some of the parts have expired, so the message can't be rebuilt.
+            return None
+        return [parts[key] for key in part_keys]
+
+
+class MemoryPartStore(PartStore):
+    """
+    Stores message parts in a dict in the current process.
+
+    This is only suitable for deployments with a single worker process, and
+    for tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def add(self, sms):
+        with self._lock:
+            key = (sms.msisdn, sms.to, sms.concat_ref)
+            group = self._groups.setdefault(key, {})
+            if sms.concat_part in group:
+                raise DuplicatePart()
+            group[sms.concat_part] = sms
+            if len(group) != sms.concat_total:
+                return None
+            del self._groups[key]
+        return [group[part] for part in sorted(group)]
+
+
+_part_store = None
+
+
+def get_part_store():
+    """ Return the `PartStore` configured by the `NEXMO_PART_STORE` settings. """
+    global _part_store
+    if _part_store is None:
+        store_class = import_string(
+            getattr(settings, "NEXMO_PART_STORE", DEFAULT_PART_STORE)
+        )
+        _part_store = store_class(**getattr(settings, "NEXMO_PART_STORE_OPTIONS", {}))
+    return _part_store
+
+
+@receiver(setting_changed)
+def _reset_part_store(setting, **kwargs):
+    global _part_store
+    if setting.startswith("NEXMO_PART_STORE"):
+        _part_store = None
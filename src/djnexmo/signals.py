@@ -0,0 +1,27 @@
+"""
+djnexmo.signals - signals sent by djnexmo.
+"""
+
+from django.dispatch import Signal
+
+
+#: Sent when a message queued with `djnexmo.send` has been accepted by Nexmo.
+#: Arguments: `params` (the message sent), `response` (Nexmo's decoded response).
+message_sent = Signal()
+
+#: Sent when a message queued with `djnexmo.send` could not be sent.
+#: Arguments: `params` (the message), `exception` (the final error).
+message_failed = Signal()
+
+#: Sent by `sms_webhook` and `dlr_webhook`, which are the senders, as they
+#: finish each stage of handling a webhook, if anything is connected to it.
+#: Arguments: `stage` (one of "decode", "deduplicate", "signature", "parse",
+#: "store" and "view"), `duration` (in seconds).
+webhook_stage_timed = Signal()
+
+#: Sent by `sms_webhook`, `sms_batch_webhook` and `dlr_webhook`, which are
+#: the senders, when something notable happens while handling a webhook. Arguments: `event` (one of "signature_rejected",
+#: "duplicate_delivery", "duplicate_part", "part_stored" and
+#: "message_reassembled"), `parts` (the number of parts in a reassembled
+#: message, otherwise 1).
+webhook_event = Signal()
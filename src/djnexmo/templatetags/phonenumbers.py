@@ -1,7 +1,9 @@
 from django import template
 from django.template.defaultfilters import stringfilter
 
-import phonenumbers
+from phonenumbers import PhoneNumberFormat
+
+from djnexmo.formatting import format_number
 
 register = template.Library()
 
@@ -9,22 +11,10 @@ register = template.Library()
 @register.filter(name="international")
 @stringfilter
 def international(value):
-    value = value.strip()
-    if not value.startswith("+"):
-        value = "+" + value
-    phonenumbers.parse(value)
-    return phonenumbers.format_number(
-        phonenumbers.parse(value), phonenumbers.PhoneNumberFormat.INTERNATIONAL
-    )
+    return format_number(value, PhoneNumberFormat.INTERNATIONAL)
 
 
 @register.filter(name="national")
 @stringfilter
 def national(value):
-    value = value.strip()
-    if not value.startswith("+"):
-        value = "+" + value
-    phonenumbers.parse(value)
-    return phonenumbers.format_number(
-        phonenumbers.parse(value), phonenumbers.PhoneNumberFormat.NATIONAL
-    )
+    return format_number(value, PhoneNumberFormat.NATIONAL)
@@ -1 +1,10 @@
-from django.shortcuts import render, HttpResponse
+from django.http import HttpResponse
+
+from .metrics import registry
+
+
+def prometheus_metrics(request):
+    """ Expose djnexmo's metrics in Prometheus' text format. Enable them with `NEXMO_METRICS = True`. """
+    return HttpResponse(
+        registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,160 @@
+"""
+djnexmo.workers - queues of work handled by background threads.
+
+`ThreadPoolDispatcher`, `OutboundQueue` and `BatchWriter` each hand work to
+threads in the current process. `WorkerPool` holds the queue and threads
+they have in common, and `Shared` holds the instance of each which is
+configured by settings.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.core.signals import setting_changed
+
+
+logger = logging.getLogger(__name__)
+
+# Queued once for each thread, to stop it:
+STOP = object()
+
+_shared = []
+
+
+class WorkerPool:
+    """
+    A queue of items handled by a pool of `workers` background threads.
+
+    The queue holds at most `queue_size` items, or any number if it's 0.
+    Threads don't survive a fork, so they're started when the first item is
+    queued in each process. Subclasses implement `_handle`, which is called
+    with each item.
+    """
+
+    thread_name = "djnexmo-worker"
+
+    def __init__(self, workers=1, queue_size=0):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+    @property
+    def started(self):
+        """ Whether the threads have been started in this process. """
+        return self._pid == os.getpid()
+
+    def _start(self):
+        with self._lock:
+            if self.started:
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(
+                    target=self._work,
+                    name="{name}-{index}".format(name=self.thread_name, index=index),
+                    daemon=True,
+                )
+                for index in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _put(self, item, block=True, timeout=None):
+        """ Queue `item`, raising `queue.Full` if there's no space for it. """
+        if not self.started:
+            self._start()
+        self._queue.put(item, block, timeout)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is STOP:
+                    return
+                self._handle(item)
+            except Exception:
+                logger.exception("%s failed to handle an item.", self.thread_name)
+            finally:
+                self._queue.task_done()
+
+    def _handle(self, item):
+        raise NotImplementedError()
+
+    def join(self):
+        """ Block until every queued item has been handled. """
+        self._queue.join()
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stop the threads once the items already queued have been handled.
+
+        If `wait` is True, block for up to `timeout` seconds for each thread
+        to stop (forever if `None`).
+        """
+        with self._lock:
+            threads, self._threads, self._pid = self._threads, [], None
+        for _ in threads:
+            self._queue.put(STOP)
+        if wait:
+            for thread in threads:
+                thread.join(timeout)
+
+
+class Shared:
+    """
+    The instance of a class, such as a `WorkerPool`, which is shared by the process and configured by settings.
+
+    `factory` is called to build the instance when it's first needed, and
+    again after any of `setting_names` change, when the old instance is shut
+    down without waiting. When the process exits the instance is shut down,
+    waiting up to its `drain_timeout` attribute, if it has one, for the work
+    already queued.
+    """
+
+    def __init__(self, factory, setting_names):
+        self.factory = factory
+        self.setting_names = frozenset(setting_names)
+        self._instance = None
+        self._built = False
+        self._lock = threading.Lock()
+        setting_changed.connect(self._reset, weak=False)
+        _shared.append(self)
+
+    def get(self):
+        """ Return the instance, building it if necessary. """
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._instance = self.factory()
+                    self._built = True
+        return self._instance
+
+    def _reset(self, setting, **kwargs):
+        if setting in self.setting_names:
+            with self._lock:
+                instance, self._instance, self._built = self._instance, None, False
+            if hasattr(instance, "shutdown"):
+                instance.shutdown(wait=False)
+
+    def drain(self):
+        """ Shut down the instance, waiting for the work already queued. """
+        instance = self._instance
+        if not hasattr(instance, "shutdown"):
+            return
+        timeout = getattr(instance, "drain_timeout", None)
+        if timeout is None:
+            instance.shutdown(wait=True)
+        else:
+            instance.shutdown(wait=True, timeout=timeout)
+
+
+@atexit.register
+def drain():
+    """ Finish the work queued by every `Shared` instance in this process. """
+    for shared in _shared:
+        shared.drain()
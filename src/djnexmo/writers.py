@@ -0,0 +1,172 @@
+"""
+djnexmo.writers - write model instances to the database in batches.
+
+Saving each delivery receipt as it arrives costs a transaction per webhook.
+A `BatchWriter` gathers instances in a queue, and a background thread saves
+them with `bulk_create` once `batch_size` have been gathered or `interval`
+seconds after the first of them arrived, whichever is sooner. The writer for
+delivery receipts is configured with the `NEXMO_DLR_WRITER_OPTIONS` setting,
+a dict of keyword arguments used to construct it.
+"""
+
+import logging
+import queue
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, router
+
+from .workers import STOP, Shared, WorkerPool
+
+
+logger = logging.getLogger(__name__)
+
+# Queued to end the current batch early:
+_FLUSH = object()
+
+
+class BatchWriter(WorkerPool):
+    """
+    Saves model instances in batches from a background thread.
+
+    Instances wait in a queue holding at most `queue_size` of them. If the
+    queue is full, `write` returns `False` and the caller should save the
+    instance itself, so a slow database slows down webhooks instead of
+    losing data. Instances still queued when the process exits are saved
+    before it exits, waiting at most `drain_timeout` seconds (forever if
+    `None`).
+    """
+
+    thread_name = "djnexmo-writer"
+
+    def __init__(
+        self, batch_size=500, interval=1.0, queue_size=10000, drain_timeout=None
+    ):
+        super().__init__(1, queue_size)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.rejected = 0
+
+    def write(self, instance):
+        """ Queue `instance` to be saved, returning `False` if the queue is full. """
+        try:
+            self._put(instance, block=False)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        return True
+
+    def _work(self):
+        while True:
+            batch, stop = self._collect()
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                # Mark the items, including any flush or stop marker, as done:
+                for _ in range(len(batch) + (stop is not None)):
+                    self._queue.task_done()
+            if stop is STOP:
+                return
+
+    def _collect(self):
+        """
+        Return a batch of queued instances, and the marker which ended it, if any.
+
+        Waits for the first instance, then for up to `interval` seconds for more.
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                item = self._queue.get()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is _FLUSH or item is STOP:
+                return batch, item
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.interval
+        return batch, None
+
+    def _write(self, batch):
+        close_old_connections()
+        batches = {}
+        for instance in batch:
+            batches.setdefault(type(instance), []).append(instance)
+        for model, instances in batches.items():
+            manager = model._default_manager.db_manager(router.db_for_write(model))
+            try:
+                self._bulk_create(manager, instances)
+            except Exception:
+                logger.warning(
+                    "Failed to save a batch of %d %s objects; saving them one at a time.",
+                    len(instances),
+                    model._meta.object_name,
+                    exc_info=True,
+                )
+                self._write_each(manager, instances)
+            else:
+                with self._lock:
+                    self.written += len(instances)
+                    self.batches += 1
+        close_old_connections()
+
+    def _write_each(self, manager, instances):
+        """ Save `instances` one at a time, so only those which can't be saved are lost. """
+        for instance in instances:
+            try:
+                self._bulk_create(manager, [instance])
+            except Exception:
+                logger.exception(
+                    "Failed to save %s object %r.", type(instance).__name__, instance
+                )
+                with self._lock:
+                    self.failed += 1
+            else:
+                with self._lock:
+                    self.written += 1
+
+    def _bulk_create(self, manager, instances):
+        manager.bulk_create(instances)
+
+    def flush(self):
+        """ Save every queued instance now, and block until they've been saved. """
+        if self.started:
+            self._put(_FLUSH)
+            self.join()
+
+    def stats(self):
+        """ Return a dict of metrics describing the writer. """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "rejected": self.rejected,
+            }
+
+
+_receipt_writer = Shared(
+    lambda: BatchWriter(**getattr(settings, "NEXMO_DLR_WRITER_OPTIONS", {})),
+    ["NEXMO_DLR_WRITER_OPTIONS"],
+)
+
+
+def get_receipt_writer():
+    """ Return the `BatchWriter` configured by the `NEXMO_DLR_WRITER_OPTIONS` setting. """
+    return _receipt_writer.get()
@@ -1,13 +1,21 @@
 from django.conf import settings
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 def pytest_configure():
     settings.configure(
         DEBUG=True,
-        INSTALLED_APPS=["djnexmo"],
+        INSTALLED_APPS=[
+            "django.contrib.admin",
+            "django.contrib.auth",
+            "django.contrib.contenttypes",
+            "django.contrib.messages",
+            "djnexmo",
+        ],
         DATABASES={
             "default": {
                 "ENGINE": "django.db.backends.sqlite3",
@@ -22,3 +30,13 @@ def pytest_configure():
         USE_L10N=True,
         USE_TZ=True,
     )
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_state():
+    """ Forget the messages and parts stored by previous tests, which share message IDs. """
+    from django.core.cache import cache
+    from djnexmo.idempotency import get_delivery_log
+
+    get_delivery_log().clear()
+    cache.clear()